@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import apply_sqlite_pragmas
+        from .replicas import track_writes
+
+        connection_created.connect(
+            apply_sqlite_pragmas, dispatch_uid='core.sqlite_pragmas'
+        )
+        connection_created.connect(
+            track_writes, dispatch_uid='core.replicas.track_writes'
+        )
@@ -0,0 +1,22 @@
+import math
+
+
+def percentile(values, pct):
+    """Перцентиль по методу ближайшего ранга: pct=95 даёт p95."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """Сводка по замерам в секундах, для вывода в отчётах бенчмарков."""
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values, default=0.0),
+    }
@@ -0,0 +1,294 @@
+"""Бэкенды кэша с метриками попаданий и общий для процессов SQLite-кэш.
+
+LocMemCache живёт внутри процесса: у каждого воркера gunicorn свой
+холодный кэш, а сброс поколений в одном воркере не виден другим.
+SQLiteCache хранит записи в одном файле на узле, его читают и пишут все
+воркеры; WAL позволяет читать параллельно с записью.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import profiling
+
+# Первый байт значения: как его распаковывать
+RAW, COMPRESSED = b'r', b'z'
+# Переполнение проверяется раз в столько записей процесса, а не на
+# каждой: COUNT(*) по всей таблице дороже самой записи
+CULL_CHECK_EVERY = 100
+
+
+class CacheMetrics:
+    """Счётчики попаданий и промахов, общие для потоков процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+class MetricsMixin:
+    """Считает попадания get/get_many; доступ через cache.metrics()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics = CacheMetrics()
+        # Базовый get_many (у LocMemCache) вызывает self.get на каждый
+        # ключ - эти обращения уже посчитаны в get
+        self._get_many_counted_by_get = (
+            super().get_many.__func__ is BaseCache.get_many
+        )
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = super().get(key, sentinel, version=version)
+        hit = value is not sentinel
+        self._metrics.record(hit, not hit)
+        profiling.record_cache(hit, not hit)
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        if self._get_many_counted_by_get:
+            return found
+        self._metrics.record(len(found), len(keys) - len(found))
+        profiling.record_cache(len(found), len(keys) - len(found))
+        return found
+
+    def metrics(self):
+        return self._metrics.snapshot()
+
+    def reset_metrics(self):
+        self._metrics.reset()
+
+
+class InstrumentedLocMemCache(MetricsMixin, LocMemCache):
+    """LocMemCache с метриками - для разработки и тестов."""
+
+
+class SQLiteStore(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов узла.
+
+    LOCATION - путь к файлу. OPTIONS: MAX_ENTRIES и CULL_FREQUENCY как у
+    встроенных бэкендов, COMPRESS_MIN_LENGTH - с какого размера значение
+    сжимается zlib (крупные фрагменты HTML), BUSY_TIMEOUT - сколько
+    секунд ждать блокировку записи. KEY_PREFIX и VERSION работают как
+    у любого бэкенда Django.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._compress_min_length = int(
+            options.get('COMPRESS_MIN_LENGTH', 1024)
+        )
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(
+                self._path, timeout=self._busy_timeout,
+                isolation_level=None, check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            db.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._local.db = db
+            self._local.writes = 0
+        return db
+
+    @contextmanager
+    def _immediate(self):
+        """Транзакция с блокировкой записи с самого начала."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _encode(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self._compress_min_length:
+            return COMPRESSED + zlib.compress(data)
+        return RAW + data
+
+    @staticmethod
+    def _decode(blob):
+        blob = bytes(blob)
+        data = blob[1:]
+        if blob[:1] == COMPRESSED:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _write(self, db, key, value, timeout, mode):
+        expires = self.get_backend_timeout(timeout)
+        if expires is not None and expires <= time.time():
+            db.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return False
+        self._maybe_cull(db)
+        cursor = db.execute(
+            f'INSERT OR {mode} INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, self._encode(value), expires),
+        )
+        return cursor.rowcount == 1
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._immediate() as db:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires < ?',
+                (key, time.time()),
+            )
+            return self._write(db, key, value, timeout, 'IGNORE')
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(
+            self._db, self._key(key, version), value, timeout, 'REPLACE'
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._immediate() as db:
+            for key, value in data.items():
+                self._write(
+                    db, self._key(key, version), value, timeout, 'REPLACE'
+                )
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires >= ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires >= ?)',
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        return default if row is None else self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires >= ?)',
+            (*keys, time.time()),
+        ).fetchall()
+        return {keys[key]: self._decode(value) for key, value in rows}
+
+    def has_key(self, key, version=None):
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires >= ?)',
+            (self._key(key, version), time.time()),
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        # Чтение и запись под одной блокировкой: поколения кэша (см.
+        # posts.caching) увеличивают разные воркеры одновременно
+        key = self._key(key, version)
+        with self._immediate() as db:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires >= ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._decode(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._encode(value), key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        with self._immediate() as db:
+            for key in keys:
+                db.execute(
+                    'DELETE FROM cache WHERE key = ?',
+                    (self._key(key, version),),
+                )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _maybe_cull(self, db):
+        self._local.writes += 1
+        if self._cull_frequency == 0 or (
+            self._local.writes % CULL_CHECK_EVERY
+        ):
+            return
+        db.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+        count = db.execute('SELECT count(*) FROM cache').fetchone()[0]
+        if count >= self._max_entries:
+            # Первыми уходят записи, которые и так истекут раньше всех
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def close(self, **kwargs):
+        # Соединение живёт столько же, сколько поток: открывать файл
+        # SQLite на каждый запрос дороже самого обращения к кэшу
+        pass
+
+
+class SQLiteCache(MetricsMixin, SQLiteStore):
+    """SQLiteStore с метриками попаданий."""
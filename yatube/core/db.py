@@ -0,0 +1,42 @@
+"""Настройка новых соединений с БД и помощники для транзакций."""
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+
+def pragma_statements(pragmas):
+    """SQL для словаря PRAGMA; имена и значения проверяются заранее."""
+    statements = []
+    for name, value in pragmas.items():
+        if not name.isidentifier() or not (
+            isinstance(value, int) or str(value).isidentifier()
+        ):
+            raise ImproperlyConfigured(
+                f'Недопустимая PRAGMA в SQLITE_PRAGMAS: {name}={value!r}'
+            )
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Выполняет SQLITE_PRAGMAS на только что открытом соединении SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(settings.SQLITE_PRAGMAS):
+            cursor.execute(statement)
+
+
+def now_and_on_commit(func, *args):
+    """Вызывает func сейчас и, внутри транзакции, ещё раз после фиксации.
+
+    Сброс кэша до фиксации не защищает от читателя, который успел
+    прочитать старые строки и сохранил их уже под новым поколением;
+    повторный вызов после фиксации делает такую запись устаревшей.
+    """
+    result = func(*args)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(func, *args))
+    return result
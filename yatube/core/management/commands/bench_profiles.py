@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ('dev', 'prod')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность профилей настроек: каждый '
+        'профиль прогоняет loadtest в отдельном процессе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*', default=['/'],
+            help='Адреса для запросов (по умолчанию - главная)',
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--profiles', nargs='+', choices=PROFILES, default=PROFILES,
+        )
+
+    def handle(self, *args, **options):
+        manage = os.path.join(settings.BASE_DIR, 'manage.py')
+        for profile in options['profiles']:
+            # Настройки читаются при старте процесса, поэтому каждый
+            # профиль - свой процесс с YATUBE_SETTINGS
+            result = subprocess.run(
+                [
+                    sys.executable, manage, 'loadtest', *options['urls'],
+                    '--mode', 'wsgi',
+                    '--requests', str(options['requests']),
+                    '--concurrency', str(options['concurrency']),
+                    '--threads', str(options['concurrency']),
+                    '--client-delay', '0',
+                ],
+                env={
+                    # Замер локальный: рабочему профилю хватит ключа
+                    # разработки, если свой не задан
+                    'YATUBE_SECRET_KEY': settings.SECRET_KEY,
+                    **os.environ, 'YATUBE_SETTINGS': profile,
+                },
+                capture_output=True, text=True,
+            )
+            if result.returncode:
+                raise CommandError(
+                    f'Профиль {profile} завершился с ошибкой:\n'
+                    f'{result.stderr}'
+                )
+            report = result.stdout.strip().replace('wsgi: ', '', 1)
+            self.stdout.write(f'{profile}: {report}')
@@ -0,0 +1,140 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.benchmark import summarize
+from core.db import pragma_statements
+
+# Поведение sqlite3 по умолчанию: журнал отката, полная синхронизация
+DEFAULT_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Смешанная нагрузка чтения и записи на отдельный файл SQLite: '
+        'настройки SQLITE_PRAGMAS против журнала отката по умолчанию'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--rows', type=int, default=20000,
+            help='Сколько постов в таблице до начала замера',
+        )
+
+    def handle(self, *args, **options):
+        configurations = {
+            'default': DEFAULT_PRAGMAS,
+            'configured': settings.SQLITE_PRAGMAS,
+        }
+        for name, pragmas in configurations.items():
+            workdir = tempfile.mkdtemp()
+            try:
+                path = os.path.join(workdir, 'bench.sqlite3')
+                self.prepare(path, pragmas, options['rows'])
+                results = self.run(path, pragmas, options)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            for kind in ('read', 'write'):
+                timings, errors = results[kind]
+                summary = summarize(timings)
+                self.stdout.write(
+                    f'{name} {kind}: '
+                    f'{summary["count"] / options["seconds"]:.0f} в секунду, '
+                    f'p95 {summary["p95"] * 1000:.1f} мс, '
+                    f'p99 {summary["p99"] * 1000:.1f} мс, '
+                    f'ошибок блокировки {errors}'
+                )
+
+    @staticmethod
+    def connect(path, pragmas):
+        # Как у Django: ожидание блокировки 5 с, транзакции явные
+        db = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False,
+        )
+        for statement in pragma_statements(pragmas):
+            db.execute(statement)
+        return db
+
+    def prepare(self, path, pragmas, rows):
+        db = self.connect(path, pragmas)
+        db.execute(
+            'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+            'text TEXT, pub_date REAL)'
+        )
+        db.execute('CREATE INDEX post_pub_date ON post (pub_date)')
+        db.execute('BEGIN')
+        db.executemany(
+            'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+            (
+                (number % 100, f'Пост номер {number}', number)
+                for number in range(rows)
+            ),
+        )
+        db.execute('COMMIT')
+        db.close()
+
+    def run(self, path, pragmas, options):
+        results = {'read': ([], [0]), 'write': ([], [0])}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+
+        def read(db):
+            # Страница ленты, как на главной
+            db.execute(
+                'SELECT id, author_id, text FROM post '
+                'ORDER BY pub_date DESC LIMIT 10 OFFSET ?',
+                (random.randrange(100) * 10,),
+            ).fetchall()
+
+        def write(db):
+            # Публикация поста: короткая транзакция записи
+            db.execute('BEGIN IMMEDIATE')
+            db.execute(
+                'INSERT INTO post (author_id, text, pub_date) '
+                'VALUES (?, ?, ?)',
+                (random.randrange(100), 'Новый пост', time.time()),
+            )
+            db.execute('COMMIT')
+
+        def worker(kind, operation):
+            db = self.connect(path, pragmas)
+            timings, errors = results[kind]
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    operation(db)
+                except sqlite3.OperationalError:
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+                    with lock:
+                        errors[0] += 1
+                    continue
+                with lock:
+                    timings.append(time.perf_counter() - started)
+            db.close()
+
+        threads = [
+            threading.Thread(target=worker, args=('read', read))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=('write', write))
+            for _ in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            kind: (timings, errors[0])
+            for kind, (timings, errors) in results.items()
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import WsgiToAsgi, environ
+from core.benchmark import summarize
+
+
+def _scope(url):
+    parts = urlsplit(url)
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': parts.path or '/',
+        'query_string': parts.query.encode(),
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест в процессе: пропускная способность и задержки '
+        'WSGI и ASGI при одинаковом числе потоков и медленных клиентах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*', default=['/'],
+            help='Адреса для запросов, по кругу (по умолчанию - главная)',
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Сколько клиентов отправляют запросы одновременно',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Рабочих потоков сервера в обоих режимах',
+        )
+        parser.add_argument(
+            '--client-delay', type=float, default=0.05,
+            help='Сколько секунд клиент принимает ответ',
+        )
+        parser.add_argument(
+            '--mode', choices=('wsgi', 'asgi', 'both'), default='both',
+        )
+
+    def handle(self, *args, **options):
+        self.application = get_wsgi_application()
+        urls = options['urls']
+        jobs = [urls[number % len(urls)] for number in range(
+            options['requests']
+        )]
+        modes = ('wsgi', 'asgi') if options['mode'] == 'both' else (
+            options['mode'],
+        )
+        for mode in modes:
+            run = self.run_wsgi if mode == 'wsgi' else self.run_asgi
+            started = time.perf_counter()
+            timings = run(jobs, options)
+            self.report(mode, timings, time.perf_counter() - started)
+
+    def run_wsgi(self, jobs, options):
+        # Потоков сервера столько же, сколько в пуле ASGI
+        workers = threading.BoundedSemaphore(options['threads'])
+        queue = iter(jobs)
+        lock = threading.Lock()
+        timings = []
+
+        def client():
+            while True:
+                with lock:
+                    url = next(queue, None)
+                if url is None:
+                    return
+                started = time.perf_counter()
+                with workers:
+                    result = self.application(
+                        environ(_scope(url), BytesIO()),
+                        lambda status, headers, exc_info=None: None,
+                    )
+                    b''.join(result)
+                    result.close()
+                # Клиент принимает ответ уже без потока сервера, как и в
+                # ASGI: режимы различаются только устройством пула
+                time.sleep(options['client_delay'])
+                with lock:
+                    timings.append(time.perf_counter() - started)
+
+        clients = [
+            threading.Thread(target=client)
+            for _ in range(options['concurrency'])
+        ]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return timings
+
+    def run_asgi(self, jobs, options):
+        bridge = WsgiToAsgi(self.application, threads=options['threads'])
+        timings = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            # Отдача ответа ждёт клиента в цикле событий, а не в потоке
+            if message['type'] == 'http.response.body' and not (
+                message.get('more_body')
+            ):
+                await asyncio.sleep(options['client_delay'])
+
+        async def client(queue):
+            while queue:
+                url = queue.pop()
+                started = time.perf_counter()
+                await bridge(_scope(url), receive, send)
+                timings.append(time.perf_counter() - started)
+
+        async def main():
+            queue = list(jobs)
+            await asyncio.gather(*(
+                client(queue) for _ in range(options['concurrency'])
+            ))
+
+        try:
+            asyncio.run(main())
+        finally:
+            bridge.executor.shutdown(wait=True)
+        return timings
+
+    def report(self, mode, timings, elapsed):
+        summary = summarize(timings)
+        self.stdout.write(
+            f'{mode}: {summary["count"]} запросов за {elapsed:.2f} с, '
+            f'{summary["count"] / elapsed:.1f} запросов/с, '
+            f'p50 {summary["p50"] * 1000:.1f} мс, '
+            f'p95 {summary["p95"] * 1000:.1f} мс, '
+            f'p99 {summary["p99"] * 1000:.1f} мс'
+        )
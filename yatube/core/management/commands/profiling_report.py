@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import profiling
+
+COLUMNS = ('total_ms', 'sql_ms', 'template_ms', 'queries', 'bytes')
+
+
+class Command(BaseCommand):
+    help = 'Сводка выборочного профилирования запросов по view'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*',
+            help='Какие view показать (по умолчанию - все)',
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Забыть накопленные замеры после вывода',
+        )
+
+    def handle(self, *args, **options):
+        if profiling.is_process_local():
+            # Снимки воркеров лежат в их собственной памяти, отсюда
+            # отчёт всегда был бы пустым
+            raise CommandError(
+                'Кэш по умолчанию не общий для процессов, замеров '
+                'воркеров не видно: запустите с YATUBE_CACHE_BACKEND=sqlite'
+            )
+        report = profiling.collect()
+        if options['views']:
+            report = {
+                view: summary for view, summary in report.items()
+                if view in options['views']
+            }
+        if not report:
+            self.stdout.write('Замеров пока нет')
+        for view, summary in report.items():
+            hit_rate = summary['cache_hit_rate']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{view}: {summary["requests"]} запросов, попадания в кэш '
+                + ('-' if hit_rate is None else f'{hit_rate:.0%}')
+            ))
+            for column in COLUMNS:
+                values = summary[column]
+                self.stdout.write(
+                    f'  {column:<12} среднее {values["mean"]:>10} '
+                    f'p50 <= {values["p50"]:<8} p95 <= {values["p95"]}'
+                )
+        if options['reset']:
+            profiling.reset()
+            self.stdout.write(self.style.SUCCESS('Замеры сброшены'))
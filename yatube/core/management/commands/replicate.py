@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import copy_database, mark_synced, written
+
+
+class Command(BaseCommand):
+    help = (
+        'Замена репликации для SQLite: копирует основную БД в файлы '
+        'реплик. Веб-процессы должны видеть тот же кэш '
+        '(YATUBE_CACHE_BACKEND=sqlite), иначе реплики не считаются '
+        'догнавшими и все чтения остаются на основной БД'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'replicas', nargs='*',
+            help='Какие реплики обновить (по умолчанию - все)',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые столько секунд (0 - один раз)',
+        )
+
+    def handle(self, *args, **options):
+        replicas = options['replicas'] or settings.DATABASE_REPLICAS
+        unknown = set(replicas) - set(settings.DATABASE_REPLICAS)
+        if unknown or not replicas:
+            raise CommandError(
+                'Нет таких реплик: ' + ', '.join(sorted(unknown))
+                if unknown else 'Реплики не настроены: YATUBE_DB_REPLICAS'
+            )
+        while True:
+            for alias in replicas:
+                # Номер берётся до копии: в ней есть как минимум эти записи
+                position = written()
+                copy_database(
+                    settings.DATABASES['default']['NAME'],
+                    settings.DATABASES[alias]['NAME'],
+                )
+                mark_synced(alias, position)
+                self.stdout.write(f'{alias}: до записи {position}')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,205 @@
+"""Двухуровневый read-through кэш объектов моделей.
+
+Первый уровень - ограниченный LRU внутри процесса, второй - общий кэш
+Django. У каждого объекта есть версия в общем кэше; сигналы save/delete
+увеличивают её, и все процессы узнают об изменении при следующем чтении.
+Запись в кэше помнит версии и тех объектов, что подгружены через
+select_related, поэтому правка автора делает устаревшим и кэш его поста.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+
+from .db import now_and_on_commit
+
+_MISSING = object()
+
+
+def _version_key(label, pk):
+    return f'objects:version:{label}:{pk}'
+
+
+def _epoch_key(label):
+    return f'objects:epoch:{label}'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Версия вытеснена: новое значение не совпадёт с прежними
+        cache.add(key, time.time_ns(), None)
+
+
+def _current(keys):
+    found = cache.get_many(keys)
+    for key in set(keys) - found.keys():
+        cache.add(key, time.time_ns(), None)
+        found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def invalidate(model, pk):
+    """Делает устаревшим кэш объекта; нужен после QuerySet.update().
+
+    Внутри транзакции версии сдвигаются ещё раз после её фиксации.
+    """
+    label = model._meta.label_lower
+    now_and_on_commit(_bump, _version_key(label, pk))
+    now_and_on_commit(_bump, _epoch_key(label))
+
+
+def _on_change(sender, instance, **kwargs):
+    invalidate(sender, instance.pk)
+
+
+class LocalLRU:
+    """Потокобезопасный LRU фиксированного размера."""
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class ObjectCache:
+    """Кэш объектов queryset по уникальному полю field.
+
+    get() возвращает новый экземпляр на каждый вызов (из pickle), так что
+    вызывающий код может менять его, не задевая других. На попадании
+    нужно одно чтение версий из общего кэша и ни одного запроса к БД.
+    """
+
+    def __init__(self, queryset, field='pk', related=(), size=1000,
+                 timeout=None):
+        self.model = queryset.model
+        self.label = self.model._meta.label_lower
+        self.field = field
+        self.related = tuple(related)
+        self.timeout = timeout
+        self.local = LocalLRU(size)
+        self.queryset = queryset.select_related(*self.related)
+        self._related_labels = tuple(
+            self.model._meta.get_field(name).related_model._meta.label_lower
+            for name in self.related
+        )
+        for model in {self.model} | {
+            self.model._meta.get_field(name).related_model
+            for name in self.related
+        }:
+            for signal in (post_save, post_delete):
+                signal.connect(
+                    _on_change, sender=model, weak=False,
+                    dispatch_uid=f'objectcache:{model._meta.label_lower}',
+                )
+
+    def _entry_key(self, pk):
+        return f'objects:entry:{self.label}:{pk}'
+
+    def _alias_key(self, value):
+        return f'objects:alias:{self.label}:{self.field}:{value}'
+
+    def _dependencies(self, obj):
+        keys = [_version_key(self.label, obj.pk)]
+        for name, label in zip(self.related, self._related_labels):
+            related_id = getattr(obj, self.model._meta.get_field(
+                name
+            ).attname)
+            if related_id is not None:
+                keys.append(_version_key(label, related_id))
+        return keys
+
+    def get(self, value):
+        """Объект по значению поля; DoesNotExist, если его нет."""
+        obj = self._cached(value)
+        if obj is _MISSING:
+            obj = self._load(value)
+        return obj
+
+    def _pk_for(self, value):
+        if self.field == 'pk':
+            return value
+        pk = self.local.get(self._alias_key(value))
+        if pk is None:
+            pk = cache.get(self._alias_key(value))
+            if pk is not None:
+                self.local.set(self._alias_key(value), pk)
+        return pk
+
+    def _cached(self, value):
+        pk = self._pk_for(value)
+        if pk is None:
+            return _MISSING
+        entry = self.local.get(self._entry_key(pk))
+        if entry is None:
+            entry = cache.get(self._entry_key(pk))
+            if entry is None:
+                return _MISSING
+            self.local.set(self._entry_key(pk), entry)
+        keys, versions, payload = entry
+        if _current(keys) != versions:
+            return _MISSING
+        obj = pickle.loads(payload)
+        # Поле могли поменять (другой slug): старый псевдоним не годится
+        if self.field != 'pk' and getattr(obj, self.field) != value:
+            return _MISSING
+        return obj
+
+    def _fetch(self, value):
+        # Запись общая для всех процессов: только с основной БД, реплика
+        # может отставать
+        return self.queryset.using(DEFAULT_DB_ALIAS).get(
+            **{self.field: value}
+        )
+
+    def _load(self, value):
+        labels = (self.label, *self._related_labels)
+        epochs = _current([_epoch_key(label) for label in labels])
+        obj = self._fetch(value)
+        keys = self._dependencies(obj)
+        versions = _current(keys)
+        # Объекты этих моделей менялись, пока шёл запрос: прочитанная
+        # строка может быть старше версий, такую запись не сохраняем
+        if _current([_epoch_key(label) for label in labels]) != epochs:
+            return obj
+        entry = (keys, versions, pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+        self.local.set(self._entry_key(obj.pk), entry)
+        cache.set(self._entry_key(obj.pk), entry, self.timeout)
+        if self.field != 'pk':
+            self.local.set(self._alias_key(value), obj.pk)
+            cache.set(self._alias_key(value), obj.pk, self.timeout)
+        return obj
+
+
+def get_or_404(object_cache, value):
+    """Как get_object_or_404, но через ObjectCache."""
+    try:
+        return object_cache.get(value)
+    except object_cache.model.DoesNotExist:
+        raise Http404(
+            f'{object_cache.model._meta.object_name} {value} не найден'
+        )
@@ -0,0 +1,333 @@
+"""Выборочное профилирование запросов в рабочем окружении.
+
+ProfilingMiddleware замеряет лишь долю запросов (PROFILING_SAMPLE_RATE):
+число и время SQL-запросов, время рендера шаблонов, попадания в кэш,
+размер и полное время ответа. Замеры копятся в гистограммах по имени
+view внутри процесса; раз в PROFILING_FLUSH_INTERVAL секунд процесс
+кладёт свой снимок в общий кэш, откуда их читают команда
+profiling_report и страница для персонала.
+
+Ключи снимков включают эпоху: reset() начинает новую, и процессы,
+заметив это при следующем сбросе, забывают старые замеры и берут слот
+заново, а не затирают своими номерами чужие слоты новой эпохи.
+"""
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.template import base as template_base
+from django.urls import Resolver404, resolve
+
+# Верхние границы корзин гистограмм; последняя - для всего, что больше
+MS_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+COUNT_BOUNDS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100, 200)
+BYTES_BOUNDS = tuple(2 ** power for power in range(10, 24, 2))
+METRICS = {
+    'total_ms': MS_BOUNDS,
+    'sql_ms': MS_BOUNDS,
+    'template_ms': MS_BOUNDS,
+    'queries': COUNT_BOUNDS,
+    'bytes': BYTES_BOUNDS,
+}
+
+_active = threading.local()
+
+EPOCH_KEY = 'profiling:epoch'
+
+
+def _slots_key(epoch):
+    return f'profiling:{epoch}:slots'
+
+
+def _slot_key(epoch, slot):
+    return f'profiling:{epoch}:slot:{slot}'
+
+
+def current_epoch():
+    epoch = cache.get(EPOCH_KEY)
+    if epoch is None:
+        # Эпоха с метки времени: вытесненный ключ не вернёт старую эпоху
+        cache.add(EPOCH_KEY, time.time_ns(), None)
+        epoch = cache.get(EPOCH_KEY)
+    return epoch
+
+
+def is_process_local():
+    """Кэш по умолчанию не общий для процессов - снимков других не видно."""
+    return isinstance(
+        caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)
+    )
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами; снимки можно складывать."""
+
+    def __init__(self, bounds, counts=None, total=0.0):
+        self.bounds = bounds
+        self.counts = list(counts or [0] * (len(bounds) + 1))
+        self.total = total
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Верхняя граница корзины с q-квантилем (оценка сверху)."""
+        threshold = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            if count and seen >= threshold:
+                return bound
+        return 0
+
+    def dump(self):
+        return {'counts': self.counts, 'total': self.total}
+
+
+class ViewStats:
+    """Все гистограммы и счётчики кэша одного view."""
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.histograms = {
+            name: Histogram(bounds, **data.get(name, {}))
+            for name, bounds in METRICS.items()
+        }
+        self.cache_hits = data.get('cache_hits', 0)
+        self.cache_misses = data.get('cache_misses', 0)
+
+    def add(self, sample):
+        for name, histogram in self.histograms.items():
+            histogram.add(sample[name])
+        self.cache_hits += sample['cache_hits']
+        self.cache_misses += sample['cache_misses']
+
+    def merge(self, other):
+        for name, histogram in self.histograms.items():
+            histogram.merge(other.histograms[name])
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+
+    def dump(self):
+        data = {
+            name: histogram.dump()
+            for name, histogram in self.histograms.items()
+        }
+        data['cache_hits'] = self.cache_hits
+        data['cache_misses'] = self.cache_misses
+        return data
+
+    def summary(self):
+        requests = self.histograms['total_ms'].count
+        lookups = self.cache_hits + self.cache_misses
+        result = {'requests': requests}
+        for name, histogram in self.histograms.items():
+            result[name] = {
+                'mean': round(histogram.mean(), 2),
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+            }
+        result['cache_hit_rate'] = (
+            round(self.cache_hits / lookups, 3) if lookups else None
+        )
+        return result
+
+
+class Registry:
+    """Статистика процесса по view и её сброс в общий кэш."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._epoch = None
+        self._slot = None
+        self._flushed = time.monotonic()
+
+    def record(self, view, sample):
+        due = (
+            time.monotonic() - self._flushed
+            >= settings.PROFILING_FLUSH_INTERVAL
+        )
+        if due:
+            self._sync_epoch()
+        with self._lock:
+            self._views.setdefault(view, ViewStats()).add(sample)
+            if due:
+                self._flushed = time.monotonic()
+                snapshot = self._snapshot()
+        if due:
+            self._write(snapshot)
+
+    def _snapshot(self):
+        return {view: stats.dump() for view, stats in self._views.items()}
+
+    def _sync_epoch(self):
+        epoch = current_epoch()
+        with self._lock:
+            if self._epoch != epoch:
+                if self._epoch is not None:
+                    # Замеры сбросили: накопленное до этого забывается
+                    self._views.clear()
+                self._epoch, self._slot = epoch, None
+
+    def _write(self, snapshot):
+        epoch = self._epoch
+        if self._slot is None:
+            # У каждого процесса свой слот: снимки пишутся целиком, без
+            # гонок чтение-изменение-запись между воркерами
+            cache.add(_slots_key(epoch), 0, settings.PROFILING_TIMEOUT)
+            self._slot = cache.incr(_slots_key(epoch))
+        cache.set(
+            _slot_key(epoch, self._slot),
+            {'pid': os.getpid(), 'views': snapshot},
+            settings.PROFILING_TIMEOUT,
+        )
+
+    def flush(self):
+        self._sync_epoch()
+        with self._lock:
+            snapshot = self._snapshot()
+        self._write(snapshot)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self._epoch = None
+            self._slot = None
+
+
+registry = Registry()
+
+
+def collect():
+    """Сводка по view из снимков всех процессов в общем кэше."""
+    epoch = current_epoch()
+    slots = cache.get(_slots_key(epoch)) or 0
+    snapshots = cache.get_many(
+        _slot_key(epoch, slot) for slot in range(1, slots + 1)
+    )
+    views = {}
+    for snapshot in snapshots.values():
+        for view, data in snapshot['views'].items():
+            views.setdefault(view, ViewStats()).merge(ViewStats(data))
+    return {view: views[view].summary() for view in sorted(views)}
+
+
+def reset():
+    """Забывает накопленное всеми процессами."""
+    epoch = current_epoch()
+    slots = cache.get(_slots_key(epoch)) or 0
+    try:
+        cache.incr(EPOCH_KEY)
+    except ValueError:
+        cache.add(EPOCH_KEY, time.time_ns(), None)
+    cache.delete_many(
+        [_slot_key(epoch, slot) for slot in range(1, slots + 1)]
+        + [_slots_key(epoch)]
+    )
+    registry.reset()
+
+
+def record_cache(hits, misses):
+    """Учитывает обращения к кэшу в замере текущего запроса, если он идёт."""
+    sample = getattr(_active, 'sample', None)
+    if sample is not None:
+        sample['cache_hits'] += hits
+        sample['cache_misses'] += misses
+
+
+def _install_template_timer():
+    render = template_base.Template.render
+    if getattr(render, 'profiled', False):
+        return
+
+    def timed_render(self, context):
+        sample = getattr(_active, 'sample', None)
+        if sample is None:
+            return render(self, context)
+        # Вложенные include уже входят во время внешнего шаблона
+        sample['template_depth'] += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            sample['template_depth'] -= 1
+            if not sample['template_depth']:
+                sample['template_ms'] += (
+                    time.perf_counter() - started
+                ) * 1000
+
+    timed_render.profiled = True
+    template_base.Template.render = timed_render
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return '<unresolved>'
+    return match.view_name
+
+
+class ProfilingMiddleware:
+    """Замеряет PROFILING_SAMPLE_RATE запросов; ставится первым.
+
+    Первым - чтобы в замер попали и ответы из кэша страниц.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _install_template_timer()
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        sample = _active.sample = {
+            'queries': 0, 'sql_ms': 0.0, 'template_ms': 0.0,
+            'template_depth': 0, 'cache_hits': 0, 'cache_misses': 0,
+        }
+
+        def sql_timer(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                sample['queries'] += 1
+                sample['sql_ms'] += (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sql_timer))
+                response = self.get_response(request)
+        finally:
+            _active.sample = None
+        sample['total_ms'] = (time.perf_counter() - started) * 1000
+        sample['bytes'] = (
+            0 if response.streaming else len(response.content)
+        )
+        registry.record(_view_name(request), sample)
+        return response
@@ -0,0 +1,168 @@
+"""Чтение лент с реплик БД без устаревших данных.
+
+ReplicaMiddleware разрешает чтение с реплик только во view из
+REPLICA_VIEWS и только для GET/HEAD. Реплика подходит, если она догнала
+все записи: каждая зафиксированная транзакция с записью в основную БД
+увеличивает счётчик записей в общем кэше, а репликация запоминает, до
+какого значения счётчика она дошла. Счётчик растёт после фиксации, но
+раньше сброса кэшей, назначенного на неё же (transaction.on_commit
+выполняет функции по порядку), - так ленты, кэш страниц и фрагментов не
+заполняются отстающими данными.
+
+Кроме того, клиент после своей записи REPLICA_STICKY_SECONDS читает
+только с основной БД (cookie) - даже если счётчик вытеснят из кэша.
+
+Локально реплики - копии файла SQLite, которые обновляет
+manage.py replicate.
+"""
+import random
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+STICKY_COOKIE = 'primary_reads'
+WRITES_KEY = 'replicas:writes'
+# Сессии пишутся на каждом входе: их читаем только с основной БД
+PRIMARY_APPS = {'sessions'}
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_state = threading.local()
+
+
+def _synced_key(alias):
+    return f'replicas:synced:{alias}'
+
+
+def written():
+    """Номер последней учтённой записи в основную БД."""
+    cache.add(WRITES_KEY, 0, None)
+    return cache.get(WRITES_KEY)
+
+
+def note_write():
+    cache.add(WRITES_KEY, 0, None)
+    cache.incr(WRITES_KEY)
+
+
+def _count_writes(execute, sql, params, many, context):
+    result = execute(sql, params, many, context)
+    if settings.DATABASE_REPLICAS and sql.lstrip()[:7].upper().startswith(
+        WRITE_STATEMENTS
+    ):
+        if getattr(_state, 'in_request', False):
+            # Дальше запрос читает только с основной БД. Ставится здесь, а
+            # не в db_for_write: маршрутизация бывает и без записи
+            # (присвоение FK, поиск в get_or_create)
+            _state.wrote = True
+        connection = context['connection']
+        if not connection.in_atomic_block:
+            # Автофиксация: запись уже видна, реплике её не хватает
+            note_write()
+        elif not any(
+            func is note_write for _, func in connection.run_on_commit
+        ):
+            # Раз на транзакцию; зарегистрировано при первой записи, то
+            # есть раньше сбросов кэша из сигналов этой транзакции
+            transaction.on_commit(note_write, using=connection.alias)
+    return result
+
+
+def track_writes(sender, connection, **kwargs):
+    """Подключает учёт записей к новому соединению с основной БД."""
+    if connection.alias == DEFAULT_DB_ALIAS:
+        connection.execute_wrappers.append(_count_writes)
+
+
+def mark_synced(alias, position):
+    """Реплика alias содержит все записи до номера position."""
+    cache.set(_synced_key(alias), position, None)
+
+
+def fresh_replicas():
+    """Реплики, в которых уже есть все учтённые записи."""
+    replicas = settings.DATABASE_REPLICAS
+    synced = cache.get_many([_synced_key(alias) for alias in replicas])
+    position = written()
+    return [
+        alias for alias in replicas
+        if synced.get(_synced_key(alias), -1) >= position
+    ]
+
+
+class ReplicaRouter:
+    """Чтение - с подходящей реплики, если его разрешил ReplicaMiddleware;
+    запись - в основную БД."""
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(_state, 'replicas', None)
+        if (
+            replicas
+            and not getattr(_state, 'wrote', False)
+            and model._meta.app_label not in PRIMARY_APPS
+        ):
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Чтение переключает на основную БД сама запись (track_writes)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной БД, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит вместе с данными
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплик для REPLICA_VIEWS; после записи ставит
+    клиенту cookie чтения с основной БД.
+
+    Ставится после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.in_request = True
+        _state.replicas = None
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.in_request = False
+            _state.replicas = None
+            _state.wrote = False
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in ('GET', 'HEAD')
+            and STICKY_COOKIE not in request.COOKIES
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+        ):
+            _state.replicas = fresh_replicas()
+
+
+def copy_database(source, target):
+    """Согласованный снимок файла SQLite source в target (backup API)."""
+    primary = sqlite3.connect(source)
+    copy = sqlite3.connect(target)
+    try:
+        primary.backup(copy)
+    finally:
+        copy.close()
+        primary.close()
@@ -0,0 +1,137 @@
+"""Кэширование дорогих вычислений без лавины пересчётов.
+
+Когда запись кэша истекает под нагрузкой, её одновременно пересчитывают
+все пришедшие запросы. get_or_compute этого не допускает:
+
+* пересчётом занимается один процесс - тот, кто взял блокировку через
+  атомарный cache.add;
+* остальные тем временем получают прежнее значение: запись живёт в кэше
+  ещё CACHE_STALE_TIMEOUT секунд после своего срока (stale-while-
+  revalidate);
+* незадолго до срока запись обновляется с вероятностью, растущей по мере
+  приближения к нему и пропорциональной времени вычисления (XFetch), так
+  что обычно значение освежается раньше, чем успевает устареть.
+
+Поколение данных передаётся в version, а не в ключ: запись прежнего
+поколения считается истёкшей и так же отдаётся, пока новое значение
+считает один процесс. Поэтому запись в БД не порождает новых ключей, и
+ждать результата (до CACHE_LOCK_WAIT секунд) приходится только при
+холодном кэше, когда прежнего значения нет вовсе.
+
+Отданное значение прежнего поколения отмечается в потоке: страницу с
+ним нельзя кэшировать целиком и подтверждать по ETag нового поколения
+(см. served_stale).
+"""
+import math
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+# Как часто проверять, не появился ли результат, пока его считает другой
+POLL_INTERVAL = 0.05
+
+_state = threading.local()
+
+
+def reset_stale():
+    """Начать учёт заново, например в начале запроса."""
+    _state.stale = False
+
+
+def served_stale():
+    """Отдавал ли get_or_compute после reset_stale() прежнее поколение."""
+    return getattr(_state, 'stale', False)
+
+
+def _lock_key(key):
+    return f'stampede:lock:{key}'
+
+
+def _acquire(cache, key):
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(key), token, settings.CACHE_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _release(cache, key, token):
+    # Проверка и удаление не атомарны, но чужую блокировку можно снять
+    # только если своя истекла - тогда вычисление и так шло слишком долго
+    if cache.get(_lock_key(key)) == token:
+        cache.delete(_lock_key(key))
+
+
+def _should_refresh(expires, delta, now):
+    if expires is None:
+        return False
+    # XFetch: -log(random) экспоненциально распределён, так что ранний
+    # пересчёт редок вдали от срока и почти неизбежен перед ним
+    early = delta * settings.CACHE_EARLY_REFRESH_BETA * -math.log(
+        1.0 - random.random()
+    )
+    return now + early >= expires
+
+
+def _compute_and_store(cache, key, compute, timeout, version):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    expires = None if timeout is None else time.time() + timeout
+    # Кэш держит запись дольше её срока, чтобы было что отдать, пока
+    # её пересчитывают
+    stored_for = None if timeout is None else (
+        timeout + settings.CACHE_STALE_TIMEOUT
+    )
+    cache.set(key, (value, expires, delta, version), stored_for)
+    return value
+
+
+def _recompute(cache, key, compute, timeout, version, token):
+    try:
+        return _compute_and_store(cache, key, compute, timeout, version)
+    finally:
+        _release(cache, key, token)
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, cache=None,
+                   version=None):
+    """Значение key из кэша или compute(), посчитанное одним процессом.
+
+    timeout - срок свежести в секундах, None - бессрочно, 0 - не
+    кэшировать. cache - бэкенд, по умолчанию cache из django.core.cache.
+    version - поколение данных; запись другого поколения устарела.
+    """
+    cache = cache or default_cache
+    if timeout == DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    if timeout is not None and timeout <= 0:
+        return compute()
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta, entry_version = entry
+        if entry_version == version and not _should_refresh(
+            expires, delta, time.time()
+        ):
+            return value
+        token = _acquire(cache, key)
+        if token is None:
+            if entry_version != version:
+                _state.stale = True
+            return value
+        return _recompute(cache, key, compute, timeout, version, token)
+    token = _acquire(cache, key)
+    if token is not None:
+        return _recompute(cache, key, compute, timeout, version, token)
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[3] == version:
+            return entry[0]
+    # Владелец блокировки не уложился: дальше ждать дороже, чем считать
+    return _compute_and_store(cache, key, compute, timeout, version)
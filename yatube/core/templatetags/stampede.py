@@ -0,0 +1,96 @@
+"""Тег {% cache %} с защитой от лавины пересчётов (см. core.stampede).
+
+Синтаксис тот же, что у встроенного тега, достаточно заменить
+{% load cache %} на {% load stampede %}. Поколение данных лучше
+передавать не в vary_on, а в version=: тогда после записи фрагмент
+прежнего поколения отдаётся, пока новый рендерит один запрос.
+"""
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from ..stampede import get_or_compute
+
+register = template.Library()
+
+
+class StampedeCacheNode(CacheNode):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on,
+                 cache_name, version=None):
+        super().__init__(
+            nodelist, expire_time_var, fragment_name, vary_on, cache_name
+        )
+        self.version = version
+
+    def _fragment_cache(self, context):
+        if not self.cache_name:
+            try:
+                return caches['template_fragments']
+            except InvalidCacheBackendError:
+                return caches['default']
+        try:
+            cache_name = self.cache_name.resolve(context)
+        except template.VariableDoesNotExist:
+            raise template.TemplateSyntaxError(
+                '"cache" tag got an unknown variable: %r'
+                % self.cache_name.var
+            )
+        try:
+            return caches[cache_name]
+        except InvalidCacheBackendError:
+            raise template.TemplateSyntaxError(
+                'Invalid cache name specified for cache tag: %r' % cache_name
+            )
+
+    def _expire_time(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+        except template.VariableDoesNotExist:
+            raise template.TemplateSyntaxError(
+                '"cache" tag got an unknown variable: %r'
+                % self.expire_time_var.var
+            )
+        if expire_time is None:
+            return None
+        try:
+            return int(expire_time)
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                '"cache" tag got a non-integer timeout value: %r'
+                % expire_time
+            )
+
+    def render(self, context):
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            self._expire_time(context),
+            cache=self._fragment_cache(context),
+            version=self.version and self.version.resolve(context),
+        )
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    """{% cache timeout name [vary_on ...] [using="cache"] [version=v] %}."""
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            "'%r' tag requires at least 2 arguments." % tokens[0]
+        )
+    options = {}
+    while len(tokens) > 3 and tokens[-1].startswith(('using=', 'version=')):
+        name, value = tokens.pop().split('=', 1)
+        options[name] = parser.compile_filter(value)
+    return StampedeCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        options.get('using'),
+        options.get('version'),
+    )
@@ -0,0 +1,101 @@
+import asyncio
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.test import SimpleTestCase, override_settings
+
+from ..asgi import WsgiToAsgi
+
+
+def echo(environ, start_response):
+    """WSGI-приложение, которое возвращает то, что получило."""
+    body = environ['wsgi.input'].read()
+    start_response('201 Created', [('Content-Type', 'text/plain'),
+                                   ('X-Path', environ['PATH_INFO'])])
+    return [
+        environ['REQUEST_METHOD'].encode(), b' ',
+        environ['QUERY_STRING'].encode(), b' ',
+        environ.get('HTTP_COOKIE', '').encode(), b' ', body,
+    ]
+
+
+def spooled(environ, start_response):
+    """WSGI-приложение: ушло ли тело запроса из памяти на диск."""
+    start_response('200 OK', [])
+    return [str(environ['wsgi.input']._rolled).encode()]
+
+
+def request(application, path, method='GET', query=b'', headers=(),
+            chunks=(b'',)):
+    """Выполняет ASGI-запрос; возвращает статус, заголовки и тело."""
+    incoming = [
+        {'type': 'http.request', 'body': chunk,
+         'more_body': number < len(chunks) - 1}
+        for number, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': query, 'headers': list(headers),
+        'server': ('localhost', 80),
+    }
+    asyncio.run(application(scope, receive, send))
+    start, *body = sent
+    return (
+        start['status'], dict(start['headers']),
+        b''.join(message['body'] for message in body),
+    )
+
+
+class WsgiToAsgiTests(SimpleTestCase):
+    def test_request_and_response(self):
+        """Метод, строка запроса, заголовки и тело по частям доходят."""
+        status, headers, body = request(
+            WsgiToAsgi(echo, threads=2), '/путь/', method='POST',
+            query=b'a=1',
+            headers=[(b'cookie', b'a=1'), (b'cookie', b'b=2')],
+            chunks=(b'first ', b'second'),
+        )
+        self.assertEqual(status, 201)
+        self.assertEqual(headers[b'content-type'], b'text/plain')
+        self.assertEqual(headers[b'x-path'].decode('latin1'),
+                         '/путь/'.encode().decode('latin1'))
+        self.assertEqual(body, b'POST a=1 a=1; b=2 first second')
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=8)
+    def test_large_body_spools_to_disk(self):
+        """Тело больше FILE_UPLOAD_MAX_MEMORY_SIZE не держится в памяти."""
+        application = WsgiToAsgi(spooled, threads=1)
+        *_, body = request(application, '/', method='POST', chunks=(b'tiny',))
+        self.assertEqual(body, b'False')
+        *_, body = request(
+            application, '/', method='POST', chunks=(b'x' * 6, b'y' * 6)
+        )
+        self.assertEqual(body, b'True')
+
+    def test_django_application(self):
+        status, headers, body = request(
+            WsgiToAsgi(get_wsgi_application(), threads=2), '/about/author/',
+            headers=[(b'host', b'localhost')],
+        )
+        self.assertEqual(status, 200)
+        self.assertIn('text/html', headers[b'content-type'].decode())
+
+    def test_loadtest_reports_both_paths(self):
+        stdout = StringIO()
+        call_command(
+            'loadtest', '/about/author/', '--requests', '10',
+            '--concurrency', '4', '--threads', '2', '--client-delay', '0',
+            stdout=stdout,
+        )
+        output = stdout.getvalue()
+        self.assertIn('wsgi: 10 запросов', output)
+        self.assertIn('asgi: 10 запросов', output)
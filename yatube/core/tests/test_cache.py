@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from ..cache import InstrumentedLocMemCache, SQLiteCache
+
+
+class CacheMetricsTests(SimpleTestCase):
+    def test_exact_counts(self):
+        """Каждый ключ get_many считается один раз на обоих бэкендах."""
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, ignore_errors=True)
+        backends = [
+            InstrumentedLocMemCache('metrics', {}),
+            SQLiteCache(os.path.join(workdir, 'cache.sqlite3'), {}),
+        ]
+        for backend in backends:
+            with self.subTest(backend=type(backend).__name__):
+                backend.set('a', 1)
+                backend.get_many(['a', 'b'])
+                backend.get('a')
+                metrics = backend.metrics()
+                self.assertEqual((metrics['hits'], metrics['misses']), (2, 1))
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, 'cache.sqlite3')
+        self.cache = self.backend()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def backend(self, **params):
+        params.setdefault('OPTIONS', {'COMPRESS_MIN_LENGTH': 100})
+        return SQLiteCache(self.path, params)
+
+    def test_basic_operations(self):
+        self.assertIsNone(self.cache.get('missing'))
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2}
+        )
+        self.cache.delete('a')
+        self.assertFalse(self.cache.has_key('a'))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expiry(self):
+        """Истёкшие записи не читаются, add их перезаписывает."""
+        self.cache.set('short', 'value', 0.05)
+        self.cache.set('forever', 'value', None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 'again'))
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_shared_between_instances(self):
+        """Второй экземпляр (как другой воркер) видит те же записи."""
+        self.cache.set('shared', 'value')
+        other = self.backend()
+        self.assertEqual(other.get('shared'), 'value')
+        other.clear()
+        self.assertIsNone(self.cache.get('shared'))
+
+    def test_prefix_and_version(self):
+        prefixed = self.backend(KEY_PREFIX='other')
+        self.cache.set('key', 'plain')
+        prefixed.set('key', 'prefixed')
+        self.assertEqual(self.cache.get('key'), 'plain')
+        self.cache.set('key', 'second', version=2)
+        self.assertEqual(self.cache.get('key', version=2), 'second')
+        self.assertEqual(self.cache.get('key'), 'plain')
+
+    def test_large_values_are_compressed(self):
+        """Крупные значения хранятся сжатыми, мелкие - как есть."""
+        value = 'фрагмент ' * 1000
+        self.cache.set('large', value)
+        self.cache.set('small', 'x')
+        blobs = dict(self.cache._db.execute(
+            'SELECT key, substr(value, 1, 1) FROM cache'
+        ).fetchall())
+        self.assertEqual(blobs[self.cache.make_key('large')], b'z')
+        self.assertEqual(blobs[self.cache.make_key('small')], b'r')
+        self.assertEqual(self.cache.get('large'), value)
+
+    def test_incr_is_atomic_across_connections(self):
+        """Параллельные incr из разных потоков не теряют приращений."""
+        self.cache.set('counter', 0, None)
+
+        def work():
+            backend = self.backend()
+            for _ in range(50):
+                backend.incr('counter')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 400)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_metrics(self):
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        self.cache.get('missing')
+        self.cache.get_many(['key', 'missing', 'other'])
+        self.assertEqual(
+            self.cache.metrics(),
+            {'hits': 2, 'misses': 3, 'hit_rate': 0.4},
+        )
+        self.cache.reset_metrics()
+        self.assertEqual(self.cache.metrics()['hits'], 0)
+
+    def test_cull(self):
+        """При переполнении старые записи вытесняются."""
+        cache = self.backend(OPTIONS={'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2})
+        for number in range(300):
+            cache.set(f'key{number}', number)
+        count = cache._db.execute('SELECT count(*) FROM cache').fetchone()[0]
+        self.assertLess(count, 300)
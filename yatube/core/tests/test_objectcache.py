@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.test import TestCase, TransactionTestCase
+
+from posts import counters
+from posts.models import Group, Post
+
+from ..objectcache import ObjectCache, get_or_404, invalidate
+
+User = get_user_model()
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='cache_author')
+        self.group = Group.objects.create(
+            title='Тест', slug='cache_slug', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Текст'
+        )
+        self.groups = ObjectCache(Group.objects.all(), 'slug')
+        self.posts = ObjectCache(
+            Post.objects.all(), related=('author', 'group')
+        )
+
+    def test_hit_without_queries(self):
+        """Повторное чтение не обращается к БД, связи подгружены сразу."""
+        self.posts.get(self.post.pk)
+        with self.assertNumQueries(0):
+            post = self.posts.get(self.post.pk)
+            self.assertEqual(post.author.username, 'cache_author')
+            self.assertEqual(post.group.slug, 'cache_slug')
+
+    def test_shared_between_processes(self):
+        """Второй экземпляр (как другой воркер) читает из общего кэша."""
+        self.posts.get(self.post.pk)
+        other = ObjectCache(Post.objects.all(), related=('author', 'group'))
+        with self.assertNumQueries(0):
+            other.get(self.post.pk)
+
+    def test_save_invalidates(self):
+        self.posts.get(self.post.pk)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertEqual(self.posts.get(self.post.pk).text, 'Новый текст')
+
+    def test_related_change_invalidates(self):
+        """Переименование автора делает устаревшим кэш его поста."""
+        self.posts.get(self.post.pk)
+        self.author.username = 'renamed_author'
+        self.author.save()
+        self.assertEqual(
+            self.posts.get(self.post.pk).author.username, 'renamed_author'
+        )
+
+    def test_update_invalidates(self):
+        """Счётчики меняются через update() и тоже сбрасывают кэш."""
+        self.groups.get('cache_slug')
+        counters.shift_group(self.group.pk, 5)
+        self.assertEqual(
+            self.groups.get('cache_slug').posts_count,
+            Group.objects.get(pk=self.group.pk).posts_count,
+        )
+
+    def test_changed_slug(self):
+        """Старый slug больше не находит группу, новый находит."""
+        self.groups.get('cache_slug')
+        self.group.slug = 'new_slug'
+        self.group.save()
+        with self.assertRaises(Group.DoesNotExist):
+            self.groups.get('cache_slug')
+        self.assertEqual(self.groups.get('new_slug').pk, self.group.pk)
+
+    def test_deleted_object(self):
+        self.posts.get(self.post.pk)
+        pk = self.post.pk
+        self.post.delete()
+        with self.assertRaises(Http404):
+            get_or_404(self.posts, pk)
+
+    def test_instances_are_independent(self):
+        """Изменение полученного объекта не портит кэш."""
+        self.posts.get(self.post.pk).text = 'Изменено'
+        self.assertEqual(self.posts.get(self.post.pk).text, 'Текст')
+
+
+class InvalidateOnCommitTests(TransactionTestCase):
+    def test_entry_cached_before_commit_goes_stale(self):
+        """Запись, сделанная до фиксации правки, после неё устаревает."""
+        cache.clear()
+        group = Group.objects.create(
+            title='Тест', slug='commit_slug', description='Описание'
+        )
+        groups = ObjectCache(Group.objects.all(), 'slug')
+        with transaction.atomic():
+            invalidate(Group, group.pk)
+            # Параллельный читатель видит старую строку и новые версии
+            groups.get('commit_slug')
+            Group.objects.filter(pk=group.pk).update(title='Новое')
+        groups.local.clear()
+        self.assertEqual(groups.get('commit_slug').title, 'Новое')
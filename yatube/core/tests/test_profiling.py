@@ -0,0 +1,85 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import profiling
+
+User = get_user_model()
+
+
+class HistogramTests(SimpleTestCase):
+    def test_quantiles_and_merge(self):
+        histogram = profiling.Histogram((1, 10, 100))
+        for value in (0.5, 5, 5, 50, 500):
+            histogram.add(value)
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.quantile(0.5), 10)
+        self.assertEqual(histogram.quantile(0.95), float('inf'))
+        other = profiling.Histogram((1, 10, 100), **histogram.dump())
+        histogram.merge(other)
+        self.assertEqual(histogram.count, 10)
+        self.assertEqual(histogram.mean(), 112.1)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_FLUSH_INTERVAL=0)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+        self.author = User.objects.create_user(username='profiled')
+        Post.objects.create(author=self.author, text='Профилируемый пост')
+
+    def test_sampled_request_is_measured(self):
+        self.client.get(reverse('posts:posts_index'))
+        summary = profiling.collect()['posts:posts_index']
+        self.assertEqual(summary['requests'], 1)
+        self.assertGreater(summary['queries']['mean'], 0)
+        self.assertGreater(summary['template_ms']['mean'], 0)
+        self.assertGreater(summary['bytes']['mean'], 0)
+        self.assertIsNotNone(summary['cache_hit_rate'])
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_skipped(self):
+        self.client.get(reverse('posts:posts_index'))
+        self.assertEqual(profiling.collect(), {})
+
+    def test_staff_endpoint(self):
+        self.client.get(reverse('posts:posts_index'))
+        url = reverse('profiling')
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        User.objects.filter(pk=self.author.pk).update(is_staff=True)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:posts_index', json.loads(response.content))
+
+    def test_reset_starts_new_epoch(self):
+        """После сброса живой процесс берёт слот заново и забывает старое."""
+        self.client.get(reverse('posts:posts_index'))
+        # Сброс из другого процесса: локальный реестр о нём не знает
+        cache.incr(profiling.EPOCH_KEY)
+        self.assertEqual(profiling.collect(), {})
+        self.client.get(reverse('about:author'))
+        self.assertEqual(profiling.registry._slot, 1)
+        self.assertEqual(list(profiling.collect()), ['about:author'])
+
+    def test_report_command_needs_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('profiling_report', stdout=StringIO())
+
+    @mock.patch.object(profiling, 'is_process_local', return_value=False)
+    def test_report_command(self, process_local):
+        self.client.get(reverse('posts:posts_index'))
+        stdout = StringIO()
+        call_command('profiling_report', '--reset', stdout=stdout)
+        self.assertIn('posts:posts_index: 1 запросов', stdout.getvalue())
+        self.assertEqual(profiling.collect(), {})
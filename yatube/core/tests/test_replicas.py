@@ -0,0 +1,168 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TransactionTestCase, override_settings,
+)
+from django.urls import ResolverMatch
+
+from posts.models import Group, Post
+
+from ..replicas import (
+    STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter, _count_writes,
+    copy_database, mark_synced, note_write, written,
+)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+
+    def request(self, method='get', view='posts_index', cookies=None,
+                write=False, model=Post, execute=True):
+        """Прогоняет запрос через middleware; куда шли чтения до и после
+        записи во view. execute=False - запись только маршрутизирована."""
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = ResolverMatch(
+            lambda request: None, (), {}, url_name=view,
+            namespaces=['posts'],
+        )
+        reads = []
+
+        def view_func(request):
+            middleware.process_view(request, view_func, (), {})
+            reads.append(self.router.db_for_read(model))
+            if write:
+                self.router.db_for_write(model)
+                if execute:
+                    _count_writes(
+                        lambda *args: None, 'UPDATE posts_post', (), False,
+                        {'connection': connection},
+                    )
+                reads.append(self.router.db_for_read(model))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view_func)
+        return middleware(request), reads
+
+    def test_fresh_replica_serves_feed(self):
+        mark_synced('replica1', written())
+        _, reads = self.request()
+        self.assertEqual(reads, ['replica1'])
+
+    def test_lagging_replica_is_skipped(self):
+        """Реплика без последней записи не используется."""
+        mark_synced('replica1', written())
+        note_write()
+        _, reads = self.request()
+        self.assertEqual(reads, ['default'])
+
+    def test_write_pins_reads_to_primary(self):
+        """После записи чтение идёт с основной БД до конца запроса, клиент
+        получает cookie."""
+        mark_synced('replica1', written())
+        response, reads = self.request(write=True)
+        self.assertEqual(reads, ['replica1', 'default'])
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        _, reads = self.request(cookies={STICKY_COOKIE: '1'})
+        self.assertEqual(reads, ['default'])
+
+    def test_routing_without_write_keeps_replica(self):
+        """db_for_write без выполненной записи (присвоение FK, поиск в
+        get_or_create) не ставит cookie."""
+        mark_synced('replica1', written())
+        response, reads = self.request(write=True, execute=False)
+        self.assertEqual(reads, ['replica1', 'replica1'])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_sticky_client_reads_primary(self):
+        mark_synced('replica1', written())
+        _, reads = self.request(cookies={STICKY_COOKIE: '1'})
+        self.assertEqual(reads, ['default'])
+
+    def test_only_safe_feed_views(self):
+        mark_synced('replica1', written())
+        for options in ({'method': 'post'}, {'view': 'post_create'},
+                        {'model': Session}):
+            with self.subTest(**options):
+                _, reads = self.request(**options)
+                self.assertEqual(reads, ['default'])
+
+    def test_reads_outside_requests_use_primary(self):
+        mark_synced('replica1', written())
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        response, reads = self.request(write=True)
+        self.assertEqual(reads, ['default', 'default'])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class WriteCountingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def create_group(self, slug):
+        return Group.objects.create(
+            title='Тест', slug=slug, description='Описание'
+        )
+
+    def test_autocommit_write_counted_after_it_runs(self):
+        position = written()
+        self.assertEqual(Group.objects.count(), 0)
+        self.assertEqual(written(), position)
+        self.create_group('autocommit')
+        self.assertEqual(written(), position + 1)
+
+    def test_transaction_counted_once_on_commit(self):
+        """Транзакция учитывается после фиксации, раньше сбросов кэша."""
+        position = written()
+        seen = []
+        with transaction.atomic():
+            group = self.create_group('atomic')
+            transaction.on_commit(lambda: seen.append(written()))
+            group.description = 'Новое'
+            group.save()
+            self.assertEqual(written(), position)
+        self.assertEqual(seen, [position + 1])
+        self.assertEqual(written(), position + 1)
+
+    def test_rolled_back_transaction_not_counted(self):
+        position = written()
+        try:
+            with transaction.atomic():
+                self.create_group('rollback')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(written(), position)
+
+
+class CopyDatabaseTests(SimpleTestCase):
+    def test_copy(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, ignore_errors=True)
+        source = os.path.join(workdir, 'primary.sqlite3')
+        target = os.path.join(workdir, 'replica.sqlite3')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE post (text TEXT)')
+            db.execute("INSERT INTO post VALUES ('Пост')")
+        db.close()
+        copy_database(source, target)
+        replica = sqlite3.connect(target)
+        self.addCleanup(replica.close)
+        self.assertEqual(
+            replica.execute('SELECT text FROM post').fetchall(), [('Пост',)]
+        )
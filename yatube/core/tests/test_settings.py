@@ -0,0 +1,84 @@
+import importlib
+import os
+import sys
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from yatube.settings import dev
+
+from ..db import apply_sqlite_pragmas, pragma_statements
+
+AUTH = 'django.contrib.auth.middleware.AuthenticationMiddleware'
+
+
+def load_prod(**environ):
+    """Заново импортирует рабочий профиль с переменными окружения."""
+    with mock.patch.dict(os.environ, environ):
+        sys.modules.pop('yatube.settings.prod', None)
+        return importlib.import_module('yatube.settings.prod')
+
+
+class SettingsProfileTests(SimpleTestCase):
+    def test_prod_profile(self):
+        """В рабочем профиле нет отладки, соединения и шаблоны живут дольше."""
+        prod = load_prod(YATUBE_SECRET_KEY='prod-secret')
+        self.assertFalse(prod.DEBUG)
+        self.assertEqual(prod.SECRET_KEY, 'prod-secret')
+        self.assertNotIn('debug_toolbar', prod.INSTALLED_APPS)
+        self.assertFalse(
+            any('debug_toolbar' in name for name in prod.MIDDLEWARE)
+        )
+        self.assertGreater(prod.DATABASES['default']['CONN_MAX_AGE'], 0)
+        [(loader, _)] = prod.TEMPLATES[0]['OPTIONS']['loaders']
+        self.assertEqual(loader, 'django.template.loaders.cached.Loader')
+        self.assertEqual(prod.SQLITE_PRAGMAS['journal_mode'], 'wal')
+
+    def test_prod_requires_secret_key(self):
+        """Без YATUBE_SECRET_KEY рабочий профиль не загружается."""
+        with mock.patch.dict(os.environ, clear=True):
+            with self.assertRaises(ImproperlyConfigured):
+                load_prod()
+
+    def test_middleware_order(self):
+        """AuthenticationMiddleware один, кэш страниц стоит после него."""
+        prod = load_prod(YATUBE_SECRET_KEY='prod-secret')
+        for profile in (dev, prod):
+            with self.subTest(profile=profile.__name__):
+                self.assertEqual(profile.MIDDLEWARE.count(AUTH), 1)
+                self.assertLess(
+                    profile.MIDDLEWARE.index(AUTH),
+                    profile.MIDDLEWARE.index(
+                        'posts.middleware.AnonymousPageCacheMiddleware'
+                    ),
+                )
+
+
+class SQLitePragmaTests(TestCase):
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -4096})
+    def test_pragmas_applied(self):
+        apply_sqlite_pragmas(sender=type(connection), connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -4096)
+
+    def test_invalid_pragma_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            pragma_statements({'cache_size; DROP TABLE posts_post': 1})
+        with self.assertRaises(ImproperlyConfigured):
+            pragma_statements({'journal_mode': 'wal; VACUUM'})
+
+    def test_benchmark_compares_journals(self):
+        stdout = StringIO()
+        call_command(
+            'bench_sqlite', '--seconds', '0.1', '--rows', '100',
+            '--readers', '1', '--writers', '1', stdout=stdout,
+        )
+        output = stdout.getvalue()
+        for line in ('default read', 'default write',
+                     'configured read', 'configured write'):
+            self.assertIn(line, output)
@@ -0,0 +1,133 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from ..stampede import _lock_key, get_or_compute
+
+
+class Counter:
+    """compute() для тестов: считает вызовы, может работать медленно."""
+
+    def __init__(self, value='value', delay=0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def expire(self, key, value='stale'):
+        cache.set(key, (value, time.time() - 1, 0.0, None), 60)
+
+    def test_value_is_cached(self):
+        compute = Counter()
+        for _ in range(3):
+            self.assertEqual(get_or_compute('key', compute, 60), 'value')
+        self.assertEqual(compute.calls, 1)
+
+    def test_zero_timeout_disables_cache(self):
+        compute = Counter()
+        get_or_compute('key', compute, 0)
+        get_or_compute('key', compute, 0)
+        self.assertEqual(compute.calls, 2)
+
+    def test_expired_value_is_recomputed(self):
+        self.expire('key')
+        compute = Counter('fresh')
+        self.assertEqual(get_or_compute('key', compute, 60), 'fresh')
+        self.assertEqual(get_or_compute('key', compute, 60), 'fresh')
+        self.assertEqual(compute.calls, 1)
+
+    def test_stale_while_revalidate(self):
+        """Пока другой процесс пересчитывает, отдаётся прежнее значение."""
+        self.expire('key')
+        cache.add(_lock_key('key'), 'other', 30)
+        compute = Counter('fresh')
+        self.assertEqual(get_or_compute('key', compute, 60), 'stale')
+        self.assertEqual(compute.calls, 0)
+
+    def test_previous_version_served_while_recomputed(self):
+        """Новое поколение не заставляет ждать: отдаётся прежнее значение."""
+        get_or_compute('key', Counter('old'), 60, version=1)
+        cache.add(_lock_key('key'), 'other', 30)
+        compute = Counter('new')
+        started = time.monotonic()
+        self.assertEqual(get_or_compute('key', compute, 60, version=2), 'old')
+        self.assertLess(time.monotonic() - started, 0.05)
+        self.assertEqual(compute.calls, 0)
+        cache.delete(_lock_key('key'))
+        self.assertEqual(get_or_compute('key', compute, 60, version=2), 'new')
+        self.assertEqual(get_or_compute('key', compute, 60, version=2), 'new')
+        self.assertEqual(compute.calls, 1)
+
+    @override_settings(CACHE_EARLY_REFRESH_BETA=1e9)
+    def test_early_refresh(self):
+        """Долгое вычисление обновляется заранее, до истечения срока."""
+        cache.set('key', ('old', time.time() + 30, 1.0, None), 60)
+        self.assertEqual(get_or_compute('key', Counter('new'), 60), 'new')
+
+    def test_single_flight(self):
+        """Одновременные промахи по одному ключу считают значение один раз."""
+        compute = Counter(delay=0.2)
+        results = []
+
+        def work():
+            results.append(get_or_compute('key', compute, 60))
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(compute.calls, 1)
+
+    @override_settings(CACHE_LOCK_WAIT=0.1)
+    def test_abandoned_lock(self):
+        """Если владелец блокировки пропал, значение считается без неё."""
+        cache.add(_lock_key('key'), 'other', 30)
+        self.assertEqual(get_or_compute('key', Counter(), 60), 'value')
+
+
+class StampedeTagTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def render(self, template, **context):
+        return Template(
+            '{% load stampede %}' + template
+        ).render(Context(context))
+
+    def test_compatible_with_cache_tag(self):
+        template = '{% cache 60 fragment key %}{{ value }}{% endcache %}'
+        self.assertEqual(self.render(template, key=1, value='a'), 'a')
+        self.assertEqual(self.render(template, key=1, value='b'), 'a')
+        self.assertEqual(self.render(template, key=2, value='c'), 'c')
+        using = ('{% cache 60 fragment key using="default" %}'
+                 '{{ value }}{% endcache %}')
+        self.assertEqual(self.render(using, key=1, value='d'), 'a')
+
+    def test_version_option(self):
+        template = ('{% cache 60 fragment key version=generation %}'
+                    '{{ value }}{% endcache %}')
+        self.assertEqual(
+            self.render(template, key=1, generation=1, value='a'), 'a'
+        )
+        self.assertEqual(
+            self.render(template, key=1, generation=1, value='b'), 'a'
+        )
+        self.assertEqual(
+            self.render(template, key=1, generation=2, value='c'), 'c'
+        )
@@ -1,7 +1,11 @@
 from http import HTTPStatus
 
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import profiling
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -27,3 +31,13 @@ def permission_denied(request, exception):
     return render(request, 'core/403.html',
                   status=HTTPStatus.FORBIDDEN
                   )
+
+
+@staff_member_required
+def profiling_report(request):
+    """Сводка выборочного профилирования по view, только для персонала."""
+    # Свежие замеры этого процесса, не дожидаясь планового сброса
+    profiling.registry.flush()
+    return JsonResponse(
+        profiling.collect(), json_dumps_params={'ensure_ascii': False}
+    )
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # Кэши объектов подключают свои сигналы при создании
+        from . import objects, signals  # noqa: F401
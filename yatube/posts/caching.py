@@ -0,0 +1,108 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from core.db import now_and_on_commit
+
+FEED = 'feed'
+# Общий счётчик записей, сбрасывающих страницы: кэш страниц не сохраняет
+# ответ, если он сдвинулся, пока страница рендерилась
+WRITES = 'writes'
+
+
+def comments_scope(post_id):
+    return f'comments:{post_id}'
+
+
+def _generation_key(scope):
+    return f'posts:generation:{scope}'
+
+
+def _start(key):
+    # Счётчик начинается с метки времени: если его вытеснят из кэша,
+    # новое значение не совпадёт ни с одним уже выданным поколением.
+    cache.add(key, time.time_ns(), None)
+
+
+def get_generation(scope):
+    """Текущее поколение данных scope для ключей кэша фрагментов."""
+    key = _generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        _start(key)
+        generation = cache.get(key)
+    return generation
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        _start(key)
+        return cache.incr(key)
+
+
+def bump_generation(scope):
+    """Делает недействительными все фрагменты, закэшированные для scope.
+
+    Внутри транзакции поколение сдвигается ещё раз после её фиксации.
+    """
+    return now_and_on_commit(_incr, _generation_key(scope))
+
+
+def get_generations(scopes):
+    """Поколения нескольких scope за одно обращение к кэшу."""
+    keys = {_generation_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        _start(key)
+        found[key] = cache.get(key)
+    return {keys[key]: generation for key, generation in found.items()}
+
+
+# Суррогатные ключи страниц: ими помечаются ответы (заголовок
+# Surrogate-Key), а сигналы сбрасывают ровно затронутые страницы.
+POSTS_KEY = 'posts'
+
+
+def post_key(post_id):
+    return f'post-{post_id}'
+
+
+def author_key(user_id):
+    return f'author-{user_id}'
+
+
+def group_key(group_id):
+    return f'group-{group_id}'
+
+
+def surrogate_scope(key):
+    return f'surrogate:{key}'
+
+
+def tag_response(response, *keys):
+    """Помечает ответ суррогатными ключами для кэша страниц и CDN."""
+    keys = [key for key in keys if key]
+    response['Surrogate-Key'] = ' '.join(keys)
+    return response
+
+
+def keys_version(keys):
+    """Сводная версия набора суррогатных ключей - основа для ETag."""
+    generations = get_generations(
+        surrogate_scope(key) for key in keys if key
+    )
+    state = ','.join(f'{scope}={generations[scope]}' for scope in sorted(
+        generations
+    ))
+    return hashlib.md5(state.encode()).hexdigest()
+
+
+def purge(*keys):
+    """Сбрасывает закэшированные страницы с любым из ключей."""
+    bump_generation(WRITES)
+    for key in set(keys):
+        if key:
+            bump_generation(surrogate_scope(key))
@@ -0,0 +1,54 @@
+"""Готовый HTML карточек постов для всех лент.
+
+Карточка (includes/include_table.html) одинакова на главной, в группе,
+профиле и подписках, поэтому рендерится один раз и хранится в кэше.
+Ключ содержит хэш всего, что в неё попадает: правка поста, смена имени
+автора или группы дают новый ключ, а старая запись просто истекает.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'includes/include_table.html'
+# Увеличить при изменении шаблона карточки, чтобы не отдавать старые
+CARD_TEMPLATE_VERSION = 1
+
+
+def card_key(post):
+    author = post.author
+    parts = (
+        CARD_TEMPLATE_VERSION,
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name,
+        post.thumbnail,
+        post.image_variants,
+        author.username,
+        author.first_name,
+        author.last_name,
+        post.group.slug if post.group_id else '',
+    )
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'posts:card:{post.id}:{digest}'
+
+
+def render_cards(posts):
+    """Пары (пост, HTML карточки) за одно чтение и одну запись кэша.
+
+    Посты должны быть загружены с select_related('author', 'group').
+    """
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    found = cache.get_many(keys)
+    missing = {}
+    for post, key in zip(posts, keys):
+        if key not in found:
+            missing[key] = found[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post}
+            )
+    if missing:
+        cache.set_many(missing, settings.POSTS_CARD_CACHE_TIMEOUT)
+    return [(post, mark_safe(found[key])) for post, key in zip(posts, keys)]
@@ -0,0 +1,166 @@
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.objectcache import invalidate
+
+from .models import Comment, Follow, Group, Post, UserStats
+from .sharding import shards
+from .utils import chunked
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+# Пользователей на одну пачку подсчёта их постов по шардам
+RECONCILE_BATCH_SIZE = 500
+
+
+def _shift(queryset, field, delta):
+    if delta < 0:
+        # Не уходим в минус, если счётчик уже разошёлся с данными
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def count_for_user(user_id):
+    counts = {}
+    for field, (model, lookup) in USER_COUNTERS.items():
+        if model is Post:
+            # Посты автора - на его шарде
+            rows = Post.objects.for_authors([user_id])
+        else:
+            rows = model.objects.filter(**{lookup: user_id})
+        counts[field] = rows.count()
+    return counts
+
+
+def shift_user(user_id, field, delta):
+    updated = _shift(UserStats.objects.filter(user_id=user_id), field, delta)
+    if not updated and delta > 0:
+        # Строки ещё нет: считаем честно, запись уже в базе
+        UserStats.objects.get_or_create(
+            user_id=user_id, defaults=count_for_user(user_id)
+        )
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        if _shift(Group.objects.filter(pk=group_id), 'posts_count', delta):
+            invalidate(Group, group_id)
+
+
+def shift_post(post_id, delta, using=None):
+    # using - шард поста, если посты шардированы
+    posts = Post.objects.db_manager(using).filter(pk=post_id)
+    if _shift(posts, 'comments_count', delta):
+        invalidate(Post, post_id)
+
+
+def stats_for(user):
+    """Счётчики пользователя; при первом обращении строка создаётся."""
+    try:
+        return UserStats.objects.get(user_id=user.pk)
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user_id=user.pk, defaults=count_for_user(user.pk)
+        )
+        return stats
+
+
+def _count(model, lookup):
+    return Coalesce(Subquery(
+        model.objects.filter(**{lookup: OuterRef('pk')}).order_by().values(
+            lookup
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def _post_counts(lookup, values=None):
+    """{значение lookup: число постов}, сложенное по всем шардам."""
+    totals = Counter()
+    for alias in shards():
+        posts = Post.objects.using(alias).order_by()
+        if values is not None:
+            posts = posts.filter(**{f'{lookup}__in': values})
+        totals.update(dict(posts.values(lookup).annotate(
+            total=Count('pk')
+        ).values_list(lookup, 'total')))
+    return totals
+
+
+def _reconcile_groups(dry_run):
+    fixed = 0
+    expected = _post_counts('group_id')
+    groups = Group.objects.values_list('pk', 'posts_count')
+    for pk, stored in groups.iterator():
+        if stored != expected[pk]:
+            fixed += 1
+            if not dry_run:
+                Group.objects.filter(pk=pk).update(posts_count=expected[pk])
+                invalidate(Group, pk)
+    return fixed
+
+
+def _reconcile_posts(dry_run):
+    fixed = 0
+    for alias in shards():
+        # Комментарии лежат на шарде своего поста
+        drifted = Post.objects.using(alias).annotate(
+            expected=_count(Comment, 'post_id')
+        ).exclude(comments_count=F('expected'))
+        for pk, value in drifted.values_list('pk', 'expected').iterator():
+            fixed += 1
+            if not dry_run:
+                Post.objects.using(alias).filter(pk=pk).update(
+                    comments_count=value
+                )
+                invalidate(Post, pk)
+    return fixed
+
+
+def _reconcile_users(users, dry_run):
+    fixed = 0
+    # Подписки - на основной БД, их считают подзапросы; посты - по шардам
+    annotations = {
+        f'expected_{field}': _count(model, lookup)
+        for field, (model, lookup) in USER_COUNTERS.items()
+        if model is not Post
+    }
+    current = [f'stats__{field}' for field in USER_COUNTERS]
+    rows = users.annotate(**annotations).values(
+        'pk', *current, *annotations
+    )
+    for chunk in chunked(rows.iterator(), RECONCILE_BATCH_SIZE):
+        posts = _post_counts('author_id', [row['pk'] for row in chunk])
+        for row in chunk:
+            values = {
+                field: posts[row['pk']] if model is Post
+                else row[f'expected_{field}']
+                for field, (model, _) in USER_COUNTERS.items()
+            }
+            stored = {
+                field: row[f'stats__{field}'] for field in USER_COUNTERS
+            }
+            if stored == values:
+                continue
+            # Строки нет и считать нечего - её создаст stats_for при чтении
+            if stored['posts_count'] is None and not any(values.values()):
+                continue
+            fixed += 1
+            if not dry_run:
+                UserStats.objects.update_or_create(
+                    user_id=row['pk'], defaults=values
+                )
+    return fixed
+
+
+def reconcile(users, dry_run=False):
+    """Сверяет счётчики с данными; возвращает число исправленных строк."""
+    return (
+        _reconcile_groups(dry_run)
+        + _reconcile_posts(dry_run)
+        + _reconcile_users(users, dry_run)
+    )
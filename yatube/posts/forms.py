@@ -1,6 +1,8 @@
+from django.core.exceptions import ValidationError
 from django.forms import ModelForm
 
 from .models import Comment, Post
+from .uploads import validate_image_upload
 
 
 class PostForm(ModelForm):
@@ -14,6 +16,26 @@ class PostForm(ModelForm):
         }
         fields = ('group', 'text', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_error = None
+        upload = self.files.get('image')
+        if upload is None:
+            return
+        try:
+            validate_image_upload(upload)
+        except ValidationError as error:
+            # Отклонённый файл не должен дойти до полной проверки Pillow
+            self.upload_error = error
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.upload_error is not None:
+            self.add_error('image', self.upload_error)
+        return cleaned_data
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,64 @@
+"""Обработка изображений на Pillow без обращений к Django.
+
+Функции выполняются в отдельных процессах пула, поэтому модуль не
+импортирует ни настройки, ни модели.
+"""
+import os
+
+from PIL import Image, ImageOps, features
+
+FEED_SIZE = (960, 339)
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+SAVE_OPTIONS = {
+    'avif': {'quality': 60},
+    'webp': {'quality': 80, 'method': 4},
+    'jpeg': {'quality': 85, 'optimize': True, 'progressive': True},
+}
+
+
+def variant_size(width):
+    """Размер варианта ширины width с пропорциями ленты."""
+    return width, round(width * FEED_SIZE[1] / FEED_SIZE[0])
+
+
+def variant_name(base, width, fmt):
+    return f'{base}_{width}w.{EXTENSIONS[fmt]}'
+
+
+def supported_formats(formats):
+    """Форматы, которые умеет сохранять установленный Pillow.
+
+    JPEG есть всегда; AVIF появился в Pillow 11.2, WebP зависит от сборки.
+    """
+    return [
+        fmt for fmt in formats
+        if fmt == 'jpeg'
+        or (fmt in features.modules and features.check_module(fmt))
+    ]
+
+
+def render_variants(source, base, widths, formats):
+    """Строит все варианты картинки за одно декодирование исходника.
+
+    base - путь без суффикса; файлы получают имена variant_name().
+    Возвращает компактные метаданные {'w': [...], 'f': [...]}.
+    """
+    widths = sorted(set(widths))
+    formats = supported_formats(formats)
+    with Image.open(source) as image:
+        # JPEG можно декодировать сразу в уменьшенном масштабе
+        image.draft('RGB', variant_size(widths[-1]))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        for width in widths:
+            variant = ImageOps.fit(
+                image, variant_size(width), Image.LANCZOS,
+                centering=(0.5, 0.5),
+            )
+            for fmt in formats:
+                variant.save(
+                    variant_name(base, width, fmt), fmt.upper(),
+                    **SAVE_OPTIONS[fmt]
+                )
+    return {'w': widths, 'f': formats}
@@ -0,0 +1,53 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии или подписки в JSONL/CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=transfer.KINDS)
+        parser.add_argument('path', help='Файл выгрузки, "-" - stdout')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument(
+            '--after-id', type=int, default=0,
+            help='Продолжить выгрузку после этого id, дописывая в файл',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.POSTS_TRANSFER_BATCH_SIZE,
+            help='Через сколько строк сообщать о прогрессе',
+        )
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        fmt = transfer.detect_format(path, options['format'])
+        after_id = options['after_id']
+        _, columns = transfer.SPECS[kind]
+        rows = transfer.export_rows(kind, after_id=after_id)
+        # Продолжение дописывается в тот же файл, заголовок CSV уже есть
+        header = not after_id
+        if path == '-':
+            stream = sys.stdout
+            total = self.write(rows, stream, fmt, columns, header, options)
+        else:
+            mode = 'a' if after_id else 'w'
+            with open(path, mode, encoding='utf-8', newline='') as stream:
+                total = self.write(
+                    rows, stream, fmt, columns, header, options
+                )
+        self.stderr.write(self.style.SUCCESS(f'{kind}: выгружено {total}'))
+
+    def write(self, rows, stream, fmt, columns, header, options):
+        total = 0
+        for row in transfer.write_rows(rows, stream, fmt, columns, header):
+            total += 1
+            if total % options['batch_size'] == 0:
+                self.stderr.write(
+                    f'{total}, продолжить: --after-id {row["id"]}'
+                )
+        return total
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+from posts.sharding import shards
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры для постов с картинкой, у которых их ещё нет'
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        for alias in shards():
+            posts = Post.objects.using(alias).exclude(image='').filter(
+                thumbnail=''
+            ).values_list('id', 'image')
+            for post_id, image_name in posts.iterator():
+                try:
+                    thumbnails.generate(post_id, image_name)
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'Пост {post_id}: {error}')
+                    continue
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово миниатюр: {done}, ошибок: {failed}'
+        ))
@@ -0,0 +1,64 @@
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Загружает группы, посты, комментарии или подписки из JSONL/CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=transfer.KINDS)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.POSTS_TRANSFER_BATCH_SIZE,
+            help='Строк в одной транзакции bulk_create',
+        )
+        parser.add_argument(
+            '--start', type=int, default=0,
+            help='Пропустить столько первых строк (продолжение загрузки)',
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        kind, path, start = options['kind'], options['path'], options['start']
+        fmt = transfer.detect_format(path, options['format'])
+        started = time.monotonic()
+        done = skipped = 0
+        with open(path, encoding='utf-8', newline='') as stream:
+            rows = islice(transfer.read_rows(stream, fmt), start, None)
+            try:
+                for done, skipped in transfer.import_rows(
+                    kind, rows, options['batch_size']
+                ):
+                    rate = done / max(time.monotonic() - started, 1e-6)
+                    self.stderr.write(
+                        f'{kind}: {start + done} строк, {rate:.0f} строк/с'
+                    )
+            except Exception as error:
+                # Загруженные пачки уже закоммичены, а повтор пачки
+                # безопасен: строки с существующими id пропускаются
+                raise CommandError(
+                    f'Загрузка остановлена после строки {start + done}: '
+                    f'{error}. Продолжить: --start {start + done}'
+                ) from error
+        if not options['skip_derived']:
+            transfer.rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(
+            f'{kind}: загружено {done - skipped} строк'
+        ))
+        if skipped:
+            # Повтор уже загруженной пачки или конфликт с другими данными:
+            # существующие строки не перезаписываются
+            self.stdout.write(self.style.WARNING(
+                f'{kind}: пропущено {skipped} строк, чей id или уникальное '
+                'поле уже есть в базе'
+            ))
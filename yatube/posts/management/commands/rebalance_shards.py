@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.objectcache import invalidate
+from posts import sharding
+from posts.models import Comment, Group, Post, TimelineEntry
+from posts.search import get_backend
+from posts.transfer import bulk_create_keeping_dates
+from posts.utils import chunked
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты и комментарии авторов на их шарды после '
+        'изменения POSTS_SHARDS. Запускать без записи на сайте; при '
+        'уменьшении числа шардов старые базы должны остаться в настройках, '
+        'пока их не опустошит перенос'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько постов переедет',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.POSTS_TRANSFER_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if not options['dry_run']:
+            self.sync_references(batch_size)
+            sharding.seed_ids()
+        moved = 0
+        for source in sharding.shards():
+            author_ids = Post.objects.using(source).order_by().values_list(
+                'author_id', flat=True
+            ).distinct()
+            for author_id in list(author_ids):
+                target = sharding.shard_for(author_id)
+                if target == source:
+                    continue
+                if options['dry_run']:
+                    count = Post.objects.using(source).filter(
+                        author_id=author_id
+                    ).count()
+                else:
+                    count = self.move(author_id, source, target, batch_size)
+                moved += count
+                self.stdout.write(
+                    f'Автор {author_id}: {source} -> {target}, '
+                    f'постов {count}'
+                )
+        verb = 'Переедет' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} постов: {moved}'))
+
+    def sync_references(self, batch_size):
+        # Посты и комментарии на шардах ссылаются на пользователей и группы
+        for model in (User, Group):
+            pks = model.objects.order_by('pk').values_list('pk', flat=True)
+            for chunk in chunked(pks.iterator(), batch_size):
+                sharding.copy_rows(model, chunk)
+
+    def move(self, author_id, source, target, batch_size):
+        posts = Post.objects.using(source).filter(author_id=author_id)
+        comments = Comment.objects.using(source).filter(
+            post__author_id=author_id
+        )
+        # Даты переносятся как есть, ключи тоже: они сквозные
+        with transaction.atomic(using=target):
+            for model, queryset in ((Post, posts), (Comment, comments)):
+                rows = queryset.order_by('pk').iterator()
+                for chunk in chunked(rows, batch_size):
+                    bulk_create_keeping_dates(
+                        model.objects.using(target), chunk
+                    )
+        post_ids = list(posts.values_list('pk', flat=True))
+        comment_ids = list(comments.values_list('pk', flat=True))
+        with transaction.atomic(using=source):
+            # Материализованные ленты ссылаются на посты внешним ключом
+            TimelineEntry.objects.using(source).filter(
+                post__author_id=author_id
+            )._raw_delete(source)
+            comments._raw_delete(source)
+            posts._raw_delete(source)
+        if source == DEFAULT_DB_ALIAS:
+            get_backend().remove_comments(comment_ids)
+        for post_id in post_ids:
+            # Кэш объектов помнит, с какого шарда читался пост
+            invalidate(Post, post_id)
+            if source == DEFAULT_DB_ALIAS:
+                get_backend().remove_post(post_id)
+        return len(post_ids)
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики постов и подписок с данными'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = counters.reconcile(
+                User.objects.all(), dry_run=options['dry_run']
+            )
+        verb = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} расхождений: {fixed}'))
@@ -0,0 +1,98 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from core.stampede import reset_stale, served_stale
+
+from .caching import WRITES, get_generation, get_generations, surrogate_scope
+
+PAGE_CACHE_HEADER = 'X-Page-Cache'
+
+
+def _page_key(request):
+    url = request.build_absolute_uri()
+    return 'posts:page:' + hashlib.md5(url.encode()).hexdigest()
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш целых страниц для анонимных GET-запросов.
+
+    Кэшируются только ответы, помеченные заголовком Surrogate-Key (см.
+    caching.tag_response). Вместе со страницей хранятся поколения её
+    ключей: если сигнал сбросил хотя бы один из них, запись устарела.
+    ETag и Last-Modified выставляются при сохранении, так что повторный
+    запрос клиента или прокси получает 304 без тела.
+    Страницу с фрагментом прежнего поколения (core.stampede.served_stale)
+    не сохраняем и отдаём без ETag - для любых пользователей.
+    Должен стоять после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_stale()
+        if request.method not in ('GET', 'HEAD') or (
+            request.user.is_authenticated
+        ):
+            return self._drop_stale_etag(self.get_response(request))
+        key = _page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            response, generations, stored = entry
+            if get_generations(generations) == generations:
+                response[PAGE_CACHE_HEADER] = 'HIT'
+                return get_conditional_response(
+                    request, etag=response['ETag'], last_modified=stored,
+                    response=response,
+                )
+        writes = get_generation(WRITES)
+        response = self.get_response(request)
+        if request.method != 'GET' or not self._cacheable(response):
+            return self._drop_stale_etag(response)
+        if served_stale():
+            return self._drop_stale_etag(response)
+        # Запись во время рендера могла не попасть в страницу: такую
+        # страницу не сохраняем, следующий запрос отрисует её заново
+        if get_generation(WRITES) != writes:
+            return response
+        stored = int(time.time())
+        # ETag от view (версия данных) дешевле и точнее хэша содержимого
+        if not response.has_header('ETag'):
+            response['ETag'] = quote_etag(
+                hashlib.md5(response.content).hexdigest()
+            )
+        response['Last-Modified'] = http_date(stored)
+        response[PAGE_CACHE_HEADER] = 'MISS'
+        generations = get_generations(
+            surrogate_scope(tag) for tag in response['Surrogate-Key'].split()
+        )
+        cache.set(
+            key, (response, generations, stored),
+            settings.POSTS_PAGE_CACHE_TIMEOUT,
+        )
+        return get_conditional_response(
+            request, etag=response['ETag'], last_modified=stored,
+            response=response,
+        )
+
+    @staticmethod
+    def _drop_stale_etag(response):
+        # ETag от view описывает новое поколение, а в странице прежнее:
+        # с ним клиент получал бы 304 на устаревшую страницу и дальше
+        if served_stale():
+            del response['ETag']
+        return response
+
+    @staticmethod
+    def _cacheable(response):
+        return (
+            response.status_code == 200
+            and 'Surrogate-Key' in response
+            and not response.streaming
+            and not response.cookies
+        )
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+CREATE_SQL = (
+    'CREATE VIRTUAL TABLE posts_search USING fts5('
+    'text, comments, group_title, author, '
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+# Веса bm25 по столбцам: текст поста, комментарии, группа, автор
+RANK_SQL = (
+    "INSERT INTO posts_search(posts_search, rank) "
+    "VALUES ('rank', 'bm25(10.0, 2.0, 4.0, 4.0)')"
+)
+FILL_SQL = (
+    'INSERT INTO posts_search (rowid, text, comments, group_title, author) '
+    'SELECT p.id, p.text, '
+    "COALESCE((SELECT group_concat(c.text, ' ') FROM posts_comment c "
+    "WHERE c.post_id = p.id), ''), "
+    "COALESCE(g.title, ''), "
+    "u.username || ' ' || u.first_name || ' ' || u.last_name "
+    'FROM posts_post p '
+    'JOIN auth_user u ON u.id = p.author_id '
+    'LEFT JOIN posts_group g ON g.id = p.group_id'
+)
+
+
+def create_index(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других базах работает SimpleBackend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in (CREATE_SQL, RANK_SQL, FILL_SQL):
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
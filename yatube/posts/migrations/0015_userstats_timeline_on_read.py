@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:39
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def flag_partial_authors(apps, schema_editor):
+    # Ленты уже могли потерять посты "знаменитостей" и посты старше
+    # подтянутых при подписке
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        Q(followers_count__gt=settings.POSTS_TIMELINE_FANOUT_LIMIT)
+        | Q(posts_count__gt=settings.POSTS_TIMELINE_BACKFILL)
+    ).update(timeline_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_global_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='timeline_on_read',
+            field=models.BooleanField(default=False, verbose_name='Посты подмешиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(flag_partial_authors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+from django.db import migrations
+
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+# Документ поста больше не содержит комментариев
+CREATE_POSTS_SQL = (
+    'CREATE VIRTUAL TABLE posts_search USING fts5('
+    f'text, group_title, author, {TOKENIZE})'
+)
+RANK_POSTS_SQL = (
+    "INSERT INTO posts_search(posts_search, rank) "
+    "VALUES ('rank', 'bm25(10.0, 4.0, 4.0)')"
+)
+FILL_POSTS_SQL = (
+    'INSERT INTO posts_search (rowid, text, group_title, author) '
+    "SELECT p.id, p.text, COALESCE(g.title, ''), "
+    "u.username || ' ' || u.first_name || ' ' || u.last_name "
+    'FROM posts_post p '
+    'JOIN auth_user u ON u.id = p.author_id '
+    'LEFT JOIN posts_group g ON g.id = p.group_id'
+)
+# Строка на комментарий; post_id хранится, но не индексируется
+CREATE_COMMENTS_SQL = (
+    'CREATE VIRTUAL TABLE posts_search_comments USING fts5('
+    f'text, post_id UNINDEXED, {TOKENIZE})'
+)
+RANK_COMMENTS_SQL = (
+    "INSERT INTO posts_search_comments(posts_search_comments, rank) "
+    "VALUES ('rank', 'bm25(2.0, 0.0)')"
+)
+FILL_COMMENTS_SQL = (
+    'INSERT INTO posts_search_comments (rowid, text, post_id) '
+    'SELECT id, text, post_id FROM posts_comment'
+)
+# Прежний документ с комментариями - для отката
+CREATE_OLD_SQL = (
+    'CREATE VIRTUAL TABLE posts_search USING fts5('
+    f'text, comments, group_title, author, {TOKENIZE})'
+)
+RANK_OLD_SQL = (
+    "INSERT INTO posts_search(posts_search, rank) "
+    "VALUES ('rank', 'bm25(10.0, 2.0, 4.0, 4.0)')"
+)
+FILL_OLD_SQL = (
+    'INSERT INTO posts_search (rowid, text, comments, group_title, author) '
+    'SELECT p.id, p.text, '
+    "COALESCE((SELECT group_concat(c.text, ' ') FROM posts_comment c "
+    "WHERE c.post_id = p.id), ''), "
+    "COALESCE(g.title, ''), "
+    "u.username || ' ' || u.first_name || ' ' || u.last_name "
+    'FROM posts_post p '
+    'JOIN auth_user u ON u.id = p.author_id '
+    'LEFT JOIN posts_group g ON g.id = p.group_id'
+)
+
+
+def split_comments(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других базах работает SimpleBackend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in (
+        'DROP TABLE IF EXISTS posts_search',
+        CREATE_POSTS_SQL, RANK_POSTS_SQL, FILL_POSTS_SQL,
+        CREATE_COMMENTS_SQL, RANK_COMMENTS_SQL, FILL_COMMENTS_SQL,
+    ):
+        schema_editor.execute(sql)
+
+
+def join_comments(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in (
+        'DROP TABLE IF EXISTS posts_search_comments',
+        'DROP TABLE IF EXISTS posts_search',
+        CREATE_OLD_SQL, RANK_OLD_SQL, FILL_OLD_SQL,
+    ):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_userstats_timeline_on_read'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_comments, join_comments),
+    ]
@@ -1,13 +1,56 @@
+import json
+
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import models
 
+from .imaging import MIME_TYPES, variant_name
+from .paginators import KeysetWindow
+from .sharding import (
+    ShardedFeed, ShardedQuerySet, group_by_shard, is_sharded, shards,
+)
+
 User = get_user_model()
+COMMENTS_PER_PAGE = 50
+
+
+class DerivedFieldsModel(models.Model):
+    """Модель, чьи поля editable=False ведёт не форма, а другой код.
+
+    Счётчики меняются F()-обновлениями, миниатюры пишет фоновый пул.
+    Полное сохранение загруженного ранее объекта затёрло бы их старыми
+    значениями, поэтому save() обновляет только редактируемые поля;
+    остальные записываются, лишь если их явно назвать в update_fields.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def editable_fields(cls):
+        return [
+            field.name for field in cls._meta.concrete_fields
+            if field.editable and not field.primary_key
+        ]
 
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            kwargs['update_fields'] = self.editable_fields()
+        super().save(*args, **kwargs)
 
-class Group(models.Model):
+
+class Group(DerivedFieldsModel):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0, editable=False
+    )
 
     def __str__(self) -> str:
         return self.title
@@ -17,7 +60,24 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
-class Post(models.Model):
+class PostQuerySet(ShardedQuerySet):
+    def across_shards(self):
+        """Лента по всем шардам; без шардирования - сам запрос."""
+        if not is_sharded():
+            return self
+        return ShardedFeed([self.using(alias) for alias in shards()])
+
+    def for_authors(self, author_ids):
+        """Посты авторов, причём читаются только шарды с этими авторами."""
+        if not is_sharded():
+            return self.filter(author_id__in=author_ids)
+        return ShardedFeed([
+            self.using(alias).filter(author_id__in=ids)
+            for alias, ids in group_by_shard(author_ids).items()
+        ])
+
+
+class Post(DerivedFieldsModel):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
     author = models.ForeignKey(
@@ -35,6 +95,43 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False
+    )
+    # Заранее подготовленная миниатюра для лент (см. posts.thumbnails)
+    thumbnail = models.CharField(
+        'Миниатюра', max_length=255, blank=True, editable=False
+    )
+    # Сжатые метаданные вариантов: {"b": база имён, "w": ширины,
+    # "f": форматы}; по ним строится srcset без обращений к диску
+    image_variants = models.TextField(
+        'Варианты картинки', blank=True, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    @property
+    def thumbnail_url(self):
+        return default_storage.url(self.thumbnail) if self.thumbnail else ''
+
+    @property
+    def image_sources(self):
+        """Пары (MIME-тип, srcset) для <picture>, лучший формат первым."""
+        try:
+            variants = json.loads(self.image_variants)
+            base, widths, formats = variants['b'], variants['w'], variants['f']
+        except (ValueError, TypeError, KeyError):
+            return []
+        return [
+            (MIME_TYPES[fmt], ', '.join(
+                '{} {}w'.format(
+                    default_storage.url(variant_name(base, width, fmt)),
+                    width,
+                )
+                for width in widths
+            ))
+            for fmt in formats
+        ]
 
     def __str__(self):
         max_len_title = 15
@@ -44,7 +141,41 @@ class Post(models.Model):
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
-        ordering = ['-pub_date']
+        # id разрешает совпадения дат и совпадает с ключом курсора
+        ordering = ['-pub_date', '-id']
+        # Индексы повторяют порядок лент, чтобы ORDER BY ... LIMIT
+        # читал готовый диапазон индекса без сортировки
+        indexes = [
+            models.Index(
+                name='post_date_id_idx',
+                fields=['-pub_date', '-id'],
+            ),
+            models.Index(
+                name='post_author_date_idx',
+                fields=['author', '-pub_date', '-id'],
+            ),
+            models.Index(
+                name='post_group_date_idx',
+                fields=['group', '-pub_date', '-id'],
+            ),
+        ]
+
+
+class CommentQuerySet(ShardedQuerySet):
+    def with_authors(self):
+        return self.select_related('author')
+
+    def for_post(self, post):
+        """Комментарии поста вместе с авторами, от старых к новым."""
+        comments = self.filter(post=post)
+        if is_sharded():
+            # Комментарии лежат на шарде поста
+            comments = comments.using(post._state.db)
+        return comments.with_authors().order_by('created', 'id')
+
+    def window(self, after=None, limit=COMMENTS_PER_PAGE):
+        """Следующие limit комментариев после курсора "Показать ещё"."""
+        return KeysetWindow(self, 'created', after=after, limit=limit)
 
 
 class Comment(models.Model):
@@ -65,6 +196,28 @@ class Comment(models.Model):
     )
     created = models.DateTimeField('Дата комментария', auto_now_add=True)
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                name='comment_post_created_idx',
+                fields=['post', 'created'],
+            ),
+        ]
+
+
+class GlobalId(models.Model):
+    """Выдаёт сквозные id постам и комментариям при шардировании.
+
+    Строка на каждый выданный id; старые строки можно удалять -
+    автоинкремент SQLite не выдаёт id повторно.
+    """
+
+    class Meta:
+        verbose_name = 'Сквозной id'
+        verbose_name_plural = 'Сквозные id'
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -89,6 +242,80 @@ class Follow(models.Model):
                 fields=['user', 'author'],
             ),
         ]
+        # (user, author) уже покрыт уникальным ограничением; обратный
+        # индекс нужен для выборки подписчиков автора при раскладке ленты
+        indexes = [
+            models.Index(
+                name='follow_author_user_idx',
+                fields=['author', 'user'],
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'{self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    # Копия post.pub_date, чтобы лента читалась диапазоном по индексу
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                name='timeline_user_post_unique',
+                fields=['user', 'post'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                name='timeline_user_date_idx',
+                fields=['user', '-pub_date'],
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user}: {self.post}'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя для профиля и ленты."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    # Часть постов автора не разложена по лентам подписчиков (был
+    # "знаменитостью" или подписка подтянула не все посты): follow_index
+    # дочитывает его посты при открытии ленты
+    timeline_on_read = models.BooleanField(
+        'Посты подмешиваются в ленты при чтении', default=False
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return f'{self.user}'
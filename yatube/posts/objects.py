@@ -0,0 +1,41 @@
+"""Кэши самых частых объектов: групп по slug, авторов, постов."""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from core.objectcache import ObjectCache
+
+from .models import Group, Post
+from .sharding import get_post
+
+User = get_user_model()
+
+# В общий кэш попадают только поля автора, нужные страницам: хэш
+# пароля, почта и прочее там лишние
+AUTHOR_FIELDS = ('id', 'username', 'first_name', 'last_name')
+PRIVATE_AUTHOR_FIELDS = tuple(
+    field.name for field in User._meta.concrete_fields
+    if field.name not in AUTHOR_FIELDS
+)
+
+
+class PostCache(ObjectCache):
+    def _fetch(self, value):
+        # Пост лежит на шарде автора, а его по id не узнать; без
+        # шардирования шард один - основная БД
+        return get_post(self.queryset, **{self.field: value})
+
+
+def _cache(queryset, field='pk', related=(), cache_class=ObjectCache):
+    return cache_class(
+        queryset, field, related,
+        size=settings.POSTS_OBJECT_CACHE_SIZE,
+        timeout=settings.POSTS_OBJECT_CACHE_TIMEOUT,
+    )
+
+
+groups = _cache(Group.objects.all(), 'slug')
+authors = _cache(User.objects.only(*AUTHOR_FIELDS), 'username')
+posts = _cache(
+    Post.objects.defer(*(f'author__{name}' for name in PRIVATE_AUTHOR_FIELDS)),
+    related=('author', 'group'), cache_class=PostCache,
+)
@@ -0,0 +1,183 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(pub_date, pk, reverse=False):
+    """Упаковывает позицию (pub_date, id) в непрозрачный токен для URL."""
+    payload = json.dumps(
+        [pub_date.isoformat(), pk, int(reverse)], separators=(',', ':')
+    )
+    token = base64.urlsafe_b64encode(payload.encode())
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, id, reverse) или бросает InvalidCursor."""
+    try:
+        padding = '=' * (-len(token) % 4)
+        payload = base64.urlsafe_b64decode(token + padding)
+        raw_date, pk, reverse = json.loads(payload.decode())
+        pub_date = parse_datetime(raw_date)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise InvalidCursor(token)
+    if pub_date is None or not isinstance(pk, int):
+        raise InvalidCursor(token)
+    return pub_date, pk, bool(reverse)
+
+
+class CursorPage(Sequence):
+    """Страница keyset-пагинации: знает только соседей, но не их номера."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator,
+                 next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (pub_date, id) без COUNT(*) и OFFSET.
+
+    Каждая страница - это один запрос вида
+    ``WHERE (pub_date, id) < (:d, :i) ORDER BY pub_date DESC, id DESC
+    LIMIT per_page + 1``, поэтому глубина страницы не влияет на время ответа.
+    """
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def get_page(self, cursor):
+        """Как Paginator.get_page: битый токен ведёт на первую страницу."""
+        try:
+            position = decode_cursor(cursor) if cursor else None
+        except InvalidCursor:
+            position = None
+        if position is None:
+            return self._page_after(None)
+        pub_date, pk, reverse = position
+        if reverse:
+            return self._page_before(pub_date, pk)
+        return self._page_after((pub_date, pk))
+
+    def _page_after(self, position):
+        queryset = self.object_list.order_by('-pub_date', '-id')
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = previous_cursor = None
+        if has_next:
+            last = rows[-1]
+            next_cursor = encode_cursor(last.pub_date, last.pk)
+        if position is not None and rows:
+            first = rows[0]
+            previous_cursor = encode_cursor(
+                first.pub_date, first.pk, reverse=True
+            )
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _page_before(self, pub_date, pk):
+        queryset = self.object_list.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+        ).order_by('pub_date', 'id')
+        rows = list(queryset[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not rows:
+            return self._page_after(None)
+        first, last = rows[0], rows[-1]
+        previous_cursor = None
+        if has_previous:
+            previous_cursor = encode_cursor(
+                first.pub_date, first.pk, reverse=True
+            )
+        next_cursor = encode_cursor(last.pub_date, last.pk)
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class KeysetWindow(Sequence):
+    """Ленивое окно из limit строк после курсора, по возрастанию (date, id).
+
+    Запрос выполняется при первом обращении, поэтому окно внутри
+    закэшированного фрагмента шаблона не трогает базу.
+    """
+
+    def __init__(self, queryset, date_field, after=None, limit=50):
+        self.queryset = queryset
+        self.date_field = date_field
+        self.after = after
+        self.limit = int(limit)
+        self._rows = None
+        self._next_cursor = None
+
+    def _load(self):
+        if self._rows is not None:
+            return
+        queryset = self.queryset.order_by(self.date_field, 'id')
+        try:
+            position = decode_cursor(self.after) if self.after else None
+        except InvalidCursor:
+            position = None
+        if position is not None:
+            value, pk, _ = position
+            queryset = queryset.filter(
+                Q(**{f'{self.date_field}__gt': value})
+                | Q(**{self.date_field: value, 'id__gt': pk})
+            )
+        rows = list(queryset[:self.limit + 1])
+        if len(rows) > self.limit:
+            last = rows[self.limit - 1]
+            self._next_cursor = encode_cursor(
+                getattr(last, self.date_field), last.pk
+            )
+        self._rows = rows[:self.limit]
+
+    def __len__(self):
+        self._load()
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        self._load()
+        return self._rows[index]
+
+    @property
+    def next_cursor(self):
+        self._load()
+        return self._next_cursor
+
+    def has_more(self):
+        return self.next_cursor is not None
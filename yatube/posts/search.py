@@ -0,0 +1,372 @@
+"""Полнотекстовый поиск по постам.
+
+Пост находится по своему тексту, названию группы, имени автора и по
+тексту любого из своих комментариев. Бэкенд выбирается настройкой
+POSTS_SEARCH_BACKEND. При шардировании индекс один, на основной БД:
+документы собираются на шарде поста, найденные посты читаются со всех
+шардов.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Group, Post
+from .sharding import get_posts, shards
+from .utils import chunked
+
+User = get_user_model()
+
+FTS_TABLE = 'posts_search'
+# Комментарии - отдельные строки своего индекса: запись комментария
+# не перечитывает всю ветку поста
+COMMENTS_FTS_TABLE = 'posts_search_comments'
+FTS_COLUMNS = {
+    FTS_TABLE: ('rowid', 'text', 'group_title', 'author'),
+    COMMENTS_FTS_TABLE: ('rowid', 'text', 'post_id'),
+}
+# Документы с шардов переносятся в индекс основной БД пачками
+INDEX_BATCH_SIZE = 500
+# Не больше стольких слов из запроса попадает в MATCH
+MAX_TERMS = 8
+# Символы-маркеры подсветки: их нет в обычном тексте, поэтому сниппет
+# можно сначала экранировать, а затем заменить маркеры на <mark>
+MARK_OPEN, MARK_CLOSE = '\x02', '\x03'
+SNIPPET_TOKENS = 24
+
+WORD_RE = re.compile(r'\w+')
+
+
+def parse_terms(query):
+    """Слова запроса в нижнем регистре без операторов и кавычек."""
+    return WORD_RE.findall((query or '').lower())[:MAX_TERMS]
+
+
+def render_snippet(raw):
+    """Экранирует сниппет и превращает маркеры в теги <mark>."""
+    html = escape(raw)
+    html = html.replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+    return mark_safe(html)
+
+
+def highlight(text, terms, length=200):
+    """Подсветка на стороне Python для бэкендов без сниппетов в базе."""
+    if not terms:
+        return render_snippet(text[:length])
+    pattern = re.compile(
+        '|'.join(re.escape(term) for term in terms), re.IGNORECASE
+    )
+    match = pattern.search(text)
+    start = max(match.start() - length // 4, 0) if match else 0
+    fragment = text[start:start + length]
+    fragment = pattern.sub(
+        lambda m: MARK_OPEN + m.group(0) + MARK_CLOSE, fragment
+    )
+    if start:
+        fragment = '…' + fragment
+    if start + length < len(text):
+        fragment += '…'
+    return render_snippet(fragment)
+
+
+class SearchResults:
+    """Ленивый результат поиска, который понимает Paginator.
+
+    count() и срезы выполняют отдельные запросы, поэтому страница
+    результатов стоит один подсчёт и одну выборку LIMIT/OFFSET.
+    """
+
+    def __init__(self, backend, terms):
+        self.backend = backend
+        self.terms = terms
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.terms) if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if not self.terms or stop is not None and stop <= start:
+            return []
+        limit = -1 if stop is None else stop - start
+        return self.backend.fetch(self.terms, start, limit)
+
+
+class SearchBackend:
+    """Интерфейс бэкенда поиска.
+
+    Методы индексации вызываются из сигналов моделей; бэкенду без
+    собственного индекса достаточно оставить их пустыми.
+    """
+
+    def search(self, query):
+        return SearchResults(self, parse_terms(query))
+
+    def count(self, terms):
+        raise NotImplementedError
+
+    def fetch(self, terms, offset, limit):
+        """Посты страницы результатов с атрибутом search_snippet."""
+        raise NotImplementedError
+
+    def index_posts(self, using=None, **filters):
+        """Переиндексирует посты, отобранные фильтром по полям Post;
+        using - шард, где они лежат (по умолчанию все)."""
+
+    def remove_post(self, post_id):
+        pass
+
+    def index_comment(self, comment):
+        pass
+
+    def remove_comments(self, comment_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SimpleBackend(SearchBackend):
+    """Поиск через LIKE '%слово%' - для баз без FTS, без ранжирования."""
+
+    fields = (
+        'text', 'comments__text', 'group__title',
+        'author__username', 'author__first_name', 'author__last_name',
+    )
+
+    def _queryset(self, terms):
+        queryset = Post.objects.all()
+        for term in terms:
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset.distinct().across_shards()
+
+    def count(self, terms):
+        return self._queryset(terms).count()
+
+    def fetch(self, terms, offset, limit):
+        queryset = self._queryset(terms).select_related('author', 'group')
+        end = None if limit < 0 else offset + limit
+        posts = list(queryset[offset:end])
+        for post in posts:
+            post.search_snippet = highlight(post.text, terms)
+        return posts
+
+
+class FTS5Backend(SearchBackend):
+    """Инвертированные индексы SQLite FTS5 с ранжированием по bm25.
+
+    Таблицы создаются миграциями: в posts_search rowid равен id поста, в
+    posts_search_comments - id комментария, а post_id хранится рядом без
+    индексации. Пост находится, если все слова запроса есть в нём самом
+    или в одном из его комментариев; веса столбцов для bm25 заданы в
+    конфигурации rank тех же миграций. В каждой таблице ранжируются
+    только самые новые совпадения (POSTS_SEARCH_MAX_RESULTS), поэтому
+    частое слово не сортирует весь индекс.
+    """
+
+    def _post_document_sql(self, where):
+        return (
+            "SELECT p.id, p.text, COALESCE(g.title, ''), "
+            "u.username || ' ' || u.first_name || ' ' || u.last_name "
+            'FROM {post} p '
+            'JOIN {user} u ON u.id = p.author_id '
+            'LEFT JOIN {group} g ON g.id = p.group_id '
+            f'{where}'
+        ).format(
+            post=Post._meta.db_table,
+            group=Group._meta.db_table,
+            user=User._meta.db_table,
+        )
+
+    def _comment_document_sql(self, where):
+        return (
+            f'SELECT c.id, c.text, c.post_id FROM {Comment._meta.db_table} c '
+            f'{where}'
+        )
+
+    @staticmethod
+    def _insert_documents(alias, table, select_sql, params=()):
+        """Добавляет в table документы, которые select_sql собирает в alias."""
+        columns = FTS_COLUMNS[table]
+        insert = f'INSERT INTO {table} ({", ".join(columns)}) '
+        with connection.cursor() as cursor:
+            if alias == DEFAULT_DB_ALIAS:
+                # Индекс на той же базе: строки не проходят через Python
+                cursor.execute(insert + select_sql, params)
+                return
+            placeholders = ', '.join(['%s'] * len(columns))
+            with connections[alias].cursor() as source:
+                source.execute(select_sql, params)
+                for rows in iter(
+                    lambda: source.fetchmany(INDEX_BATCH_SIZE), []
+                ):
+                    cursor.executemany(
+                        insert + f'VALUES ({placeholders})', rows
+                    )
+
+    @staticmethod
+    def _delete_documents(cursor, table, ids):
+        # Пачками: у SQLite ограничено число параметров запроса
+        for chunk in chunked(ids, 500):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {table} WHERE rowid IN ({placeholders})',
+                chunk,
+            )
+
+    @staticmethod
+    def _match(terms):
+        # Каждое слово - префиксный запрос в кавычках: ввод пользователя
+        # не может превратиться в операторы FTS5
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    @staticmethod
+    def _newest_sql(table, column='rowid'):
+        # Последние POSTS_SEARCH_MAX_RESULTS совпадений по rowid: FTS5
+        # читает их прямо из индекса в обратном порядке, и цена запроса
+        # не растёт вместе с числом строк
+        return (
+            f'SELECT {column} FROM {table} WHERE {table} MATCH %s '
+            'ORDER BY rowid DESC LIMIT %s'
+        )
+
+    def count(self, terms):
+        match = self._match(terms)
+        limit = settings.POSTS_SEARCH_MAX_RESULTS
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM ('
+                f'SELECT * FROM ({self._newest_sql(FTS_TABLE)}) UNION '
+                'SELECT * FROM '
+                f'({self._newest_sql(COMMENTS_FTS_TABLE, "post_id")}))',
+                [match, limit, match, limit],
+            )
+            return cursor.fetchone()[0]
+
+    def _hits_sql(self, table, post_id):
+        # bm25 считается только для кандидатов: ограничение на rowid
+        # FTS5 применяет при обходе индекса
+        return (
+            f'SELECT {post_id} AS post_id, rank AS score, '
+            f'snippet({table}, -1, %s, %s, %s, %s) AS snippet '
+            f'FROM {table} WHERE {table} MATCH %s '
+            'AND rowid >= (SELECT min(rowid) FROM '
+            f'({self._newest_sql(table)}))'
+        )
+
+    def fetch(self, terms, offset, limit):
+        match = self._match(terms)
+        hit_params = [
+            MARK_OPEN, MARK_CLOSE, '…', SNIPPET_TOKENS, match,
+            match, settings.POSTS_SEARCH_MAX_RESULTS,
+        ]
+        # Пост с несколькими совпадениями ранжируется по лучшему из них,
+        # сниппет SQLite берёт из той же строки, что и min(score)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT post_id, snippet, min(score) AS best FROM ('
+                f'{self._hits_sql(FTS_TABLE, "rowid")} UNION ALL '
+                f'{self._hits_sql(COMMENTS_FTS_TABLE, "post_id")}'
+                ') GROUP BY post_id ORDER BY best LIMIT %s OFFSET %s',
+                hit_params + hit_params + [limit, offset],
+            )
+            rows = cursor.fetchall()
+        posts = get_posts(
+            Post.objects.select_related('author', 'group'),
+            [post_id for post_id, _, _ in rows],
+        )
+        results = []
+        for post_id, snippet, _ in rows:
+            post = posts.get(post_id)
+            if post is not None:
+                post.search_snippet = render_snippet(snippet)
+                results.append(post)
+        return results
+
+    def index_posts(self, using=None, **filters):
+        if not filters:
+            return self.rebuild()
+        for alias in [using] if using else shards():
+            posts = Post.objects.using(alias).filter(**filters).order_by()
+            sql, params = posts.values('id').query.sql_with_params()
+            with connection.cursor() as cursor:
+                if alias == DEFAULT_DB_ALIAS:
+                    cursor.execute(
+                        f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({sql})',
+                        params,
+                    )
+                else:
+                    # Подзапрос к шарду в DELETE основной БД не подставить
+                    self._delete_documents(
+                        cursor, FTS_TABLE,
+                        list(posts.values_list('id', flat=True)),
+                    )
+            self._insert_documents(
+                alias, FTS_TABLE,
+                self._post_document_sql(f'WHERE p.id IN ({sql})'), params,
+            )
+
+    def remove_post(self, post_id):
+        # Комментарии удаляются вместе с постом и убирают себя сами
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def index_comment(self, comment):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {COMMENTS_FTS_TABLE} WHERE rowid = %s',
+                [comment.pk],
+            )
+            cursor.execute(
+                f'INSERT INTO {COMMENTS_FTS_TABLE} (rowid, text, post_id) '
+                'VALUES (%s, %s, %s)',
+                [comment.pk, comment.text, comment.post_id],
+            )
+
+    def remove_comments(self, comment_ids):
+        with connection.cursor() as cursor:
+            self._delete_documents(cursor, COMMENTS_FTS_TABLE, comment_ids)
+
+    def rebuild(self):
+        tables = (
+            (FTS_TABLE, self._post_document_sql('')),
+            (COMMENTS_FTS_TABLE, self._comment_document_sql('')),
+        )
+        with connection.cursor() as cursor:
+            for table, _ in tables:
+                cursor.execute(f'DELETE FROM {table}')
+        for alias in shards():
+            for table, document_sql in tables:
+                self._insert_documents(alias, table, document_sql)
+        with connection.cursor() as cursor:
+            for table, _ in tables:
+                cursor.execute(
+                    f"INSERT INTO {table}({table}) VALUES ('optimize')"
+                )
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return _load_backend(settings.POSTS_SEARCH_BACKEND)
@@ -0,0 +1,327 @@
+"""Горизонтальное шардирование постов и комментариев по автору.
+
+Посты автора и комментарии к ним лежат на одном шарде из POSTS_SHARDS,
+его выбирает jump consistent hash от id автора. Пользователи, группы,
+подписки и счётчики остаются на основной БД; на остальные шарды
+пользователи и группы копируются (copy_rows), чтобы работали внешние
+ключи и select_related. Ключи постов и комментариев сквозные - их выдаёт
+таблица GlobalId основной БД.
+
+Общие ленты (главная, группа, подписки) собираются scatter-gather:
+каждый шард отдаёт свою упорядоченную голову ленты, а ShardedFeed
+сливает их k-way merge по (pub_date, id).
+
+С одним шардом (по умолчанию) всё работает как без шардирования.
+Локально шарды - файлы SQLite: YATUBE_POSTS_SHARDS=N добавляет N баз,
+после изменения их числа авторов переносит manage.py rebalance_shards.
+"""
+import heapq
+from collections import defaultdict
+from itertools import islice
+from operator import attrgetter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, router
+from django.db.models.constants import LOOKUP_SEP
+
+# Поле, по которому выбирается шард новой строки
+SHARD_KEYS = {'posts.post': 'author_id', 'posts.comment': 'post_id'}
+SHARDED_MODELS = set(SHARD_KEYS)
+
+_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def jump_hash(key, buckets):
+    """Номер корзины 0..buckets-1 для ключа (Lamping, Veach).
+
+    При переходе с n на n + 1 корзину меняют лишь около 1/(n + 1)
+    ключей, и все они уходят в новую корзину.
+    """
+    key &= _MASK
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & _MASK
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shards():
+    return settings.POSTS_SHARDS
+
+
+def is_sharded():
+    return len(settings.POSTS_SHARDS) > 1
+
+
+def shard_for(author_id):
+    """Шард с постами автора."""
+    aliases = shards()
+    return aliases[jump_hash(author_id, len(aliases))]
+
+
+def group_by_shard(author_ids):
+    """{шард: [id авторов]} только для шардов, где эти авторы есть."""
+    grouped = defaultdict(list)
+    for author_id in author_ids:
+        grouped[shard_for(author_id)].append(author_id)
+    return grouped
+
+
+def find_post_shard(post_id):
+    """Шард поста, когда известен только его id."""
+    post_model = apps.get_model('posts', 'Post')
+    for alias in shards():
+        if post_model.objects.using(alias).filter(pk=post_id).exists():
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+def get_post(queryset, **lookup):
+    """Как queryset.get(), но по всем шардам; DoesNotExist, если нигде нет."""
+    for alias in shards():
+        try:
+            return queryset.using(alias).get(**lookup)
+        except queryset.model.DoesNotExist:
+            continue
+    raise queryset.model.DoesNotExist(
+        f'{queryset.model._meta.object_name} {lookup} не найден'
+    )
+
+
+def get_posts(queryset, ids):
+    """Как queryset.in_bulk(ids), но по всем шардам."""
+    found = {}
+    for alias in shards():
+        missing = [pk for pk in ids if pk not in found]
+        if not missing:
+            break
+        found.update(queryset.using(alias).in_bulk(missing))
+    return found
+
+
+class ShardRouter:
+    """Направляет посты и комментарии на шард их автора.
+
+    Ставится перед остальными роутерами; без шардирования и для других
+    моделей ничего не решает.
+    """
+
+    def _db(self, model, instance):
+        if (
+            instance is None
+            or not is_sharded()
+            or model._meta.label_lower not in SHARDED_MODELS
+        ):
+            return None
+        label = instance._meta.label_lower
+        if label not in SHARDED_MODELS:
+            # author.posts - с шарда автора; запросы от групп и от
+            # комментариев пользователя решают ленты и get_post
+            if (
+                label == settings.AUTH_USER_MODEL.lower()
+                and model._meta.label_lower == 'posts.post'
+            ):
+                return shard_for(instance.pk)
+            return None
+        if not instance._state.adding:
+            return instance._state.db
+        if label == 'posts.post':
+            return shard_for(instance.author_id)
+        post = instance._meta.get_field('post').get_cached_value(
+            instance, None
+        )
+        if post is not None:
+            return self._db(model, post)
+        return find_post_shard(instance.post_id)
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints.get('instance'))
+
+
+class ShardedQuerySet(models.QuerySet):
+    """Запросы постов и комментариев, которые пишут на нужный шард.
+
+    Без using() Django выбирает базу для create() и get_or_create() по
+    одной модели, и роутеру не из чего узнать шард - строка ушла бы на
+    основную БД. Здесь шард выбирается по будущему объекту, как при
+    save(). bulk_create() без using() запрещён: он не выдаёт сквозных id.
+    """
+
+    def _routed(self, values):
+        if self._db is not None or not is_sharded():
+            return self
+        obj = self.model(**{
+            name: value for name, value in values.items()
+            if LOOKUP_SEP not in name
+        })
+        key = SHARD_KEYS[self.model._meta.label_lower]
+        if getattr(obj, key) is None:
+            raise ValueError(
+                f'Шард {self.model._meta.object_name} не выбрать без {key}: '
+                'передайте его или укажите using()'
+            )
+        return self.using(router.db_for_write(self.model, instance=obj))
+
+    def create(self, **kwargs):
+        queryset = self._routed(kwargs)
+        if queryset is not self:
+            return queryset.create(**kwargs)
+        return super().create(**kwargs)
+
+    def get_or_create(self, defaults=None, **kwargs):
+        queryset = self._routed({**(defaults or {}), **kwargs})
+        if queryset is not self:
+            return queryset.get_or_create(defaults, **kwargs)
+        return super().get_or_create(defaults, **kwargs)
+
+    def update_or_create(self, defaults=None, **kwargs):
+        queryset = self._routed({**(defaults or {}), **kwargs})
+        if queryset is not self:
+            return queryset.update_or_create(defaults, **kwargs)
+        return super().update_or_create(defaults, **kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is None and is_sharded():
+            raise ValueError(
+                'bulk_create() шардированной модели - только с using()'
+            )
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+def merge_ordered(iterables, ordering):
+    """k-way merge отсортированных потоков по полям ordering.
+
+    Все поля должны быть отсортированы в одну сторону, как у лент.
+    """
+    descending = {field.startswith('-') for field in ordering}
+    if len(descending) != 1:
+        raise ValueError(f'Смешанный порядок не поддерживается: {ordering}')
+    key = attrgetter(*(field.lstrip('-') for field in ordering))
+    return heapq.merge(*iterables, key=key, reverse=descending.pop())
+
+
+class ShardedFeed:
+    """Лента из нескольких шардов, которую понимают оба пагинатора.
+
+    filter(), select_related() и order_by() применяются к запросу
+    каждого шарда; count() складывает их счётчики. Срез [start:stop]
+    читает из каждого шарда первые stop строк и сливает их, поэтому
+    глубокие страницы стоят дороже в число шардов раз - курсорная
+    пагинация такого не знает.
+    """
+
+    def __init__(self, querysets, ordering=('-pub_date', '-id')):
+        self.ordering = tuple(ordering)
+        self.querysets = [
+            queryset.order_by(*self.ordering) for queryset in querysets
+        ]
+
+    def _each(self, method, *args, **kwargs):
+        return ShardedFeed([
+            getattr(queryset, method)(*args, **kwargs)
+            for queryset in self.querysets
+        ], self.ordering)
+
+    def filter(self, *args, **kwargs):
+        return self._each('filter', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self._each('select_related', *fields)
+
+    def order_by(self, *ordering):
+        return ShardedFeed(self.querysets, ordering)
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return merge_ordered(self.querysets, self.ordering)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if index < 0:
+                raise IndexError('Отрицательные индексы не поддерживаются')
+            try:
+                return self[index:index + 1][0]
+            except IndexError:
+                raise IndexError(index) from None
+        start, stop = index.start or 0, index.stop
+        heads = [
+            queryset if stop is None else queryset[:stop]
+            for queryset in self.querysets
+        ]
+        return list(islice(merge_ordered(heads, self.ordering), start, stop))
+
+
+def copy_rows(model, pks):
+    """Копирует строки model с основной БД на остальные шарды.
+
+    Нужно для пользователей и групп: на них ссылаются посты и
+    комментарии шардов. Удалённые на основной БД строки удаляются и
+    с шардов вместе с их постами.
+    """
+    pks = set(pks)
+    rows = list(model._base_manager.using(DEFAULT_DB_ALIAS).filter(
+        pk__in=pks
+    ))
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    for alias in shards():
+        if alias == DEFAULT_DB_ALIAS:
+            continue
+        manager = model._base_manager.db_manager(alias)
+        existing = set(manager.filter(pk__in=pks).values_list(
+            'pk', flat=True
+        ))
+        for row in rows:
+            if row.pk in existing:
+                manager.filter(pk=row.pk).update(**{
+                    field.attname: getattr(row, field.attname)
+                    for field in fields
+                })
+        manager.bulk_create(
+            [row for row in rows if row.pk not in existing]
+        )
+        gone = pks - {row.pk for row in rows}
+        if gone:
+            manager.filter(pk__in=gone).delete()
+
+
+def next_id():
+    """Сквозной id нового поста или комментария."""
+    global_id = apps.get_model('posts', 'GlobalId')
+    return global_id.objects.using(DEFAULT_DB_ALIAS).create().pk
+
+
+def seed_ids():
+    """Сдвигает выдачу id за максимальный id постов и комментариев.
+
+    Нужно при включении шардирования на базе, где посты уже есть.
+    """
+    global_id = apps.get_model('posts', 'GlobalId')
+    top = max(
+        model.objects.using(alias).order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        for alias in shards()
+        for model in (
+            apps.get_model('posts', 'Post'),
+            apps.get_model('posts', 'Comment'),
+        )
+    )
+    issued = global_id.objects.using(DEFAULT_DB_ALIAS).order_by(
+        '-pk'
+    ).values_list('pk', flat=True).first() or 0
+    if top > issued:
+        # Автоинкремент SQLite продолжит с наибольшего выданного id
+        global_id.objects.using(DEFAULT_DB_ALIAS).create(pk=top)
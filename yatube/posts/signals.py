@@ -0,0 +1,259 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import counters, sharding, timeline
+from .caching import (
+    FEED, POSTS_KEY, author_key, bump_generation, comments_scope, group_key,
+    post_key, purge,
+)
+from .models import Comment, Follow, Group, Post
+from .search import get_backend
+
+User = get_user_model()
+# Поля пользователя, которые попадают в поисковый документ его постов
+# и на страницы с ними
+SEARCH_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+# Счётчики обновляются первыми: от числа подписчиков зависит раскладка
+# постов по лентам.
+@receiver(pre_save, sender=Post)
+def remember_post_origin(sender, instance, **kwargs):
+    instance._counted_origin = None
+    if instance.pk is not None:
+        instance._counted_origin = Post.objects.using(
+            instance._state.db
+        ).filter(pk=instance.pk).values_list('author_id', 'group_id').first()
+
+
+# При шардировании автоинкремент шарда не годится: id постов и
+# комментариев должны быть уникальны на всех шардах сразу.
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def assign_global_id(sender, instance, **kwargs):
+    if instance.pk is None and sharding.is_sharded():
+        instance.pk = sharding.next_id()
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    origin = getattr(instance, '_counted_origin', None)
+    if created or origin is None:
+        counters.shift_user(instance.author_id, 'posts_count', 1)
+        counters.shift_group(instance.group_id, 1)
+        return
+    author_id, group_id = origin
+    if author_id != instance.author_id:
+        counters.shift_user(author_id, 'posts_count', -1)
+        counters.shift_user(instance.author_id, 'posts_count', 1)
+    if group_id != instance.group_id:
+        counters.shift_group(group_id, -1)
+        counters.shift_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.shift_user(instance.author_id, 'posts_count', -1)
+    counters.shift_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.shift_post(instance.post_id, 1, using=instance._state.db)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.shift_post(instance.post_id, -1, using=instance._state.db)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.shift_user(instance.author_id, 'followers_count', 1)
+        counters.shift_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.shift_user(instance.author_id, 'followers_count', -1)
+    counters.shift_user(instance.user_id, 'following_count', -1)
+
+
+# Материализованная лента ссылается на посты основной БД; при
+# шардировании follow_index собирает ленту с шардов авторов.
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created and not sharding.is_sharded():
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and not sharding.is_sharded():
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def drop_from_timeline(sender, instance, **kwargs):
+    timeline.drop(instance.user_id, instance.author_id)
+
+
+# Копии пользователей и групп на шардах: на них ссылаются посты. Идут
+# раньше поиска - документы постов шарда собираются из этих копий.
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def copy_to_shards(sender, instance, using, update_fields=None, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding.is_sharded():
+        return
+    # Вход обновляет только last_login - на шардах он не нужен
+    if (
+        sender is User and update_fields
+        and not SEARCH_USER_FIELDS & update_fields
+    ):
+        return
+    sharding.copy_rows(sender, [instance.pk])
+
+
+# Поисковый документ поста собирается из поста, группы и автора, поэтому
+# его обновляют изменения всех трёх моделей; комментарии индексируются
+# отдельными строками.
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_backend().index_posts(using=instance._state.db, pk=instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    get_backend().index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    get_backend().remove_comments([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_posts(sender, instance, created, **kwargs):
+    if not created:
+        get_backend().index_posts(group_id=instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance._search_post_ids = [
+        post_id for alias in sharding.shards()
+        for post_id in Post.objects.using(alias).filter(
+            group_id=instance.pk
+        ).values_list('id', flat=True)
+    ]
+
+
+@receiver(post_delete, sender=Group)
+def reindex_ungrouped_posts(sender, instance, **kwargs):
+    post_ids = getattr(instance, '_search_post_ids', None)
+    if post_ids:
+        get_backend().index_posts(pk__in=post_ids)
+
+
+@receiver(post_save, sender=User)
+def reindex_author_posts(sender, instance, created, update_fields, **kwargs):
+    # Вход обновляет только last_login - документы от этого не меняются
+    if created or update_fields and not SEARCH_USER_FIELDS & update_fields:
+        return
+    get_backend().index_posts(
+        using=sharding.shard_for(instance.pk), author_id=instance.pk
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_feed_cache(sender, **kwargs):
+    bump_generation(FEED)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments_cache(sender, instance, **kwargs):
+    bump_generation(comments_scope(instance.post_id))
+
+
+# Кэш страниц: сбрасываются страницы с ключами самого поста, его автора
+# и группы - в том числе прежних, если пост перенесли.
+def _post_keys(author_id, group_id):
+    return [author_key(author_id), group_id and group_key(group_id)]
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages(sender, instance, **kwargs):
+    keys = _post_keys(instance.author_id, instance.group_id)
+    origin = getattr(instance, '_counted_origin', None)
+    if origin is not None:
+        keys += _post_keys(*origin)
+    purge(POSTS_KEY, post_key(instance.pk), *keys)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def purge_follow_pages(sender, instance, **kwargs):
+    # Кнопка подписки в профиле и лента подписок читателя
+    purge(author_key(instance.author_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, **kwargs):
+    purge(post_key(instance.post_id))
+
+
+# Группа и имя автора видны на всех лентах с их постами: правка
+# сбрасывает ленты, страницы группы и профили её авторов (и наоборот).
+def _group_author_keys(group_id):
+    author_ids = set()
+    for alias in sharding.shards():
+        author_ids.update(Post.objects.using(alias).filter(
+            group_id=group_id
+        ).order_by().values_list('author_id', flat=True).distinct())
+    return [author_key(author_id) for author_id in sorted(author_ids)]
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_authors(sender, instance, **kwargs):
+    instance._page_author_keys = _group_author_keys(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_group_pages(sender, instance, **kwargs):
+    author_keys = getattr(instance, '_page_author_keys', None)
+    if author_keys is None:
+        author_keys = _group_author_keys(instance.pk)
+    purge(POSTS_KEY, group_key(instance.pk), *author_keys)
+
+
+@receiver(post_save, sender=User)
+def purge_author_pages(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields and not SEARCH_USER_FIELDS & update_fields:
+        return
+    group_ids = Post.objects.using(sharding.shard_for(instance.pk)).filter(
+        author_id=instance.pk, group__isnull=False
+    ).order_by().values_list('group_id', flat=True).distinct()
+    purge(
+        POSTS_KEY, author_key(instance.pk),
+        *(group_key(group_id) for group_id in group_ids)
+    )
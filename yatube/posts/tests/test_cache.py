@@ -1,9 +1,19 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.db import transaction
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client, TestCase, TransactionTestCase
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 
-from ..models import Post
+from core.stampede import _lock_key
+
+from .. import objects
+from ..caching import FEED, WRITES, get_generations
+from ..middleware import PAGE_CACHE_HEADER
+from ..models import Comment, Group, Post
 
 User = get_user_model()
 
@@ -43,3 +53,245 @@ class CacheTests(TestCase):
         response = self.client.get(reverse("posts:posts_index"))
         response_second_content = response.content
         self.assertNotEqual(response_first_content, response_second_content)
+
+    def test_new_post_invalidates_index_fragment(self):
+        """Новый пост виден на главной сразу, без очистки кэша."""
+        self.authorized_client.get(reverse('posts:posts_index'))
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response = self.authorized_client.get(reverse('posts:posts_index'))
+        self.assertContains(response, 'Свежий пост')
+
+    def test_index_fragment_varies_on_page(self):
+        """Вторая страница не отдаёт закэшированную первую."""
+        for number in range(11):
+            Post.objects.create(author=self.user, text=f'Пост номер {number}')
+        first = self.client.get(reverse('posts:posts_index'))
+        second = self.client.get(reverse('posts:posts_index') + '?page=2')
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, 'Пост номер 0')
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='page_cache_user')
+        cls.group = Group.objects.create(
+            title='Тест', slug='page_cache_slug', description='Описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group
+        )
+        self.urls = {
+            'index': reverse('posts:posts_index'),
+            'group': reverse('posts:group_list', args=[self.group.slug]),
+            'profile': reverse('posts:profile', args=[self.user.username]),
+            'detail': reverse('posts:post_detail', args=[self.post.id]),
+        }
+
+    def page_cache(self, url):
+        return self.client.get(url).get(PAGE_CACHE_HEADER)
+
+    def test_anonymous_pages_are_cached(self):
+        """Повторный анонимный запрос отдаётся из кэша без запросов к БД."""
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                self.assertEqual(self.page_cache(url), 'MISS')
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.page_cache(url), 'HIT')
+
+    def test_authorized_pages_are_not_cached(self):
+        """Авторизованным страницы не кэшируются целиком."""
+        client = Client()
+        client.force_login(self.user)
+        client.get(self.urls['index'])
+        response = client.get(self.urls['index'])
+        self.assertNotIn(PAGE_CACHE_HEADER, response)
+
+    def test_new_post_purges_its_pages(self):
+        """Новый пост сбрасывает ленту, группу, профиль и страницы автора."""
+        for url in self.urls.values():
+            self.client.get(url)
+        Post.objects.create(
+            author=self.user, text='Свежий пост', group=self.group
+        )
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                self.assertEqual(self.page_cache(url), 'MISS')
+
+    def test_comment_purges_only_post_page(self):
+        """Комментарий сбрасывает только страницу своего поста."""
+        for url in self.urls.values():
+            self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        self.assertEqual(self.page_cache(self.urls['detail']), 'MISS')
+        self.assertEqual(self.page_cache(self.urls['index']), 'HIT')
+        self.assertEqual(self.page_cache(self.urls['group']), 'HIT')
+
+    def test_group_change_purges_group_pages(self):
+        """Правка группы не трогает страницы других групп."""
+        other = Group.objects.create(
+            title='Другая', slug='page_cache_other', description='Описание'
+        )
+        other_url = reverse('posts:group_list', args=[other.slug])
+        self.client.get(self.urls['group'])
+        self.client.get(other_url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertEqual(self.page_cache(self.urls['group']), 'MISS')
+        self.assertEqual(self.page_cache(other_url), 'HIT')
+
+    def test_revalidation(self):
+        """Клиент с ETag или Last-Modified получает 304 без тела."""
+        response = self.client.get(self.urls['index'])
+        etag, modified = response['ETag'], response['Last-Modified']
+        for header, value in (
+            ('HTTP_IF_NONE_MATCH', etag),
+            ('HTTP_IF_MODIFIED_SINCE', modified),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get(self.urls['index'], **{
+                    header: value
+                })
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response = self.client.get(
+            self.urls['index'], HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class StaleFragmentTests(TestCase):
+    """Пока фрагмент пересчитывает другой запрос, отдаётся прежний."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='stale_user')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:posts_index')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        Post.objects.create(author=self.user, text='Старый пост')
+
+    @staticmethod
+    def lock_key(authenticated):
+        return _lock_key(make_template_fragment_key(
+            'index_page', ['', '', authenticated]
+        ))
+
+    def hold_lock(self, authenticated):
+        # Фрагмент главной пересчитывает другой запрос
+        cache.add(self.lock_key(authenticated), 'other', 30)
+
+    def test_stale_page_is_not_stored(self):
+        """Страница с прежним фрагментом не попадает в кэш страниц."""
+        self.client.get(self.url)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        self.hold_lock(False)
+        response = self.client.get(self.url)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertNotIn('ETag', response)
+        self.assertNotIn(PAGE_CACHE_HEADER, response)
+        cache.delete(self.lock_key(False))
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Свежий пост')
+        self.assertEqual(response[PAGE_CACHE_HEADER], 'MISS')
+
+    def test_stale_page_gets_no_etag(self):
+        """С прежним фрагментом ETag нового поколения не отдаётся."""
+        self.authorized_client.get(self.url)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        self.hold_lock(True)
+        response = self.authorized_client.get(self.url)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertNotIn('ETag', response)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='etag_user')
+        cls.other = User.objects.create_user(username='etag_other')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(author=self.user, text='Тестовый пост')
+        self.url = reverse('posts:post_detail', args=[self.post.id])
+
+    def revalidate(self, etag):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_etag_follows_data_and_viewer(self):
+        """ETag меняется с данными страницы и с пользователем."""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.revalidate(etag).status_code, 304)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.revalidate(etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.client.force_login(self.other)
+        self.assertEqual(self.revalidate(etag).status_code, 200)
+
+    def test_etag_follows_csrf_token(self):
+        """После повторного входа (новый CSRF-токен) страница не 304."""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.revalidate(etag).status_code, 304)
+        self.client.logout()
+        self.client.force_login(self.user)
+        # Вход меняет CSRF-токен
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = get_token(
+            HttpRequest()
+        )
+        self.assertEqual(self.revalidate(etag).status_code, 200)
+
+    def test_unrelated_write_keeps_etag(self):
+        """Пост другого автора не сбрасывает ETag чужой страницы."""
+        etag = self.client.get(self.url)['ETag']
+        Post.objects.create(author=self.other, text='Другой пост')
+        self.assertEqual(self.revalidate(etag).status_code, 304)
+
+
+class InvalidateOnCommitTests(TransactionTestCase):
+    def test_generations_move_again_after_commit(self):
+        """Закэшированное до фиксации под новым поколением устаревает."""
+        cache.clear()
+        user = User.objects.create_user(username='on_commit')
+        with transaction.atomic():
+            Post.objects.create(author=user, text='Пост')
+            # Параллельный читатель ещё видит старые строки
+            stale = get_generations([FEED, WRITES])
+        fresh = get_generations([FEED, WRITES])
+        self.assertGreater(fresh[FEED], stale[FEED])
+        self.assertGreater(fresh[WRITES], stale[WRITES])
+
+
+class ObjectCachePrivacyTests(TestCase):
+    def test_shared_cache_keeps_no_private_author_fields(self):
+        """В общий кэш не попадают хэш пароля и почта автора."""
+        cache.clear()
+        user = User.objects.create_user(
+            username='private', email='private@example.com',
+            password='secret-pass', first_name='Имя',
+        )
+        post = Post.objects.create(author=user, text='Текст')
+        objects.authors.local.clear()
+        objects.posts.local.clear()
+        author = objects.authors.get('private')
+        cached_post = objects.posts.get(post.pk)
+        for label, pk in (('auth.user', user.pk), ('posts.post', post.pk)):
+            payload = cache.get(f'objects:entry:{label}:{pk}')[2]
+            self.assertNotIn(user.password.encode(), payload)
+            self.assertNotIn(b'private@example.com', payload)
+        with self.assertNumQueries(0):
+            self.assertEqual(author.get_full_name(), 'Имя')
+            self.assertEqual(cached_post.author.username, 'private')
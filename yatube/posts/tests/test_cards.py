@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..cards import card_key, render_cards
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class PostCardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='card_author', first_name='Имя', last_name='Фамилия'
+        )
+        self.group = Group.objects.create(
+            title='Тест', slug='card_slug', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Карточка'
+        )
+
+    def load(self):
+        return Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+
+    def test_card_rendered_once(self):
+        """Вторая лента берёт карточку из кэша, не рендеря шаблон."""
+        post = self.load()
+        [(_, html)] = render_cards([post])
+        self.assertIn('Карточка', html)
+        self.assertIn(reverse('posts:group_list', args=['card_slug']), html)
+        cache.set(card_key(post), 'из кэша')
+        self.assertEqual(render_cards([post]), [(post, 'из кэша')])
+
+    def test_key_follows_content(self):
+        """Правка поста, имени автора или группы меняет ключ карточки."""
+        key = card_key(self.load())
+        self.assertEqual(card_key(self.load()), key)
+        changes = (
+            lambda: Post.objects.filter(pk=self.post.pk).update(text='Новый'),
+            lambda: User.objects.filter(pk=self.author.pk).update(
+                first_name='Другое'
+            ),
+            lambda: Group.objects.filter(pk=self.group.pk).update(
+                slug='other_slug'
+            ),
+            lambda: Post.objects.filter(pk=self.post.pk).update(group=None),
+        )
+        seen = {key}
+        for change in changes:
+            change()
+            key = card_key(self.load())
+            self.assertNotIn(key, seen)
+            seen.add(key)
+
+    def test_feeds_show_renamed_author(self):
+        url = reverse('posts:group_list', args=[self.group.slug])
+        self.assertContains(self.client.get(url), 'Имя Фамилия')
+        self.author.first_name = 'Новое'
+        self.author.save()
+        self.assertContains(self.client.get(url), 'Новое Фамилия')
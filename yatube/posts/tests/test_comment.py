@@ -1,9 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.cache import cache
 
-from ..models import Comment, Group, Post
+from ..models import COMMENTS_PER_PAGE, Comment, Group, Post
 
 User = get_user_model()
 
@@ -48,3 +50,62 @@ class CommentFormTests(TestCase):
             reverse('posts:post_detail', kwargs={'post_id': self.post.id})
         )
         self.assertEqual(Comment.objects.count(), comment_count + 1)
+
+    def test_comment_block_is_cached_per_post(self):
+        """Кэш комментариев не переносится на страницу другого поста."""
+        other_post = Post.objects.create(author=self.user, text='Другой')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий к посту'
+        )
+        self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': other_post.id})
+        )
+        self.assertNotContains(response, 'Комментарий к посту')
+
+    def test_new_comment_invalidates_comment_block(self):
+        """Новый комментарий виден сразу после add_comment."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.guest_client.get(url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Свежий комментарий'},
+        )
+        self.assertContains(self.guest_client.get(url), 'Свежий комментарий')
+
+    def test_comment_window_loads_more(self):
+        """Комментарии выдаются окнами с курсором "Показать ещё"."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Комм {number}')
+            for number in range(COMMENTS_PER_PAGE + 5)
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        first = self.guest_client.get(url).context['comments']
+        self.assertEqual(len(first), COMMENTS_PER_PAGE)
+        self.assertTrue(first.has_more())
+        second = self.guest_client.get(
+            url, {'comments_after': first.next_cursor}
+        ).context['comments']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_more())
+        self.assertEqual(
+            [comment.id for comment in list(first) + list(second)],
+            list(Comment.objects.for_post(self.post).values_list(
+                'id', flat=True)),
+        )
+
+    def test_comment_queries_do_not_depend_on_thread_size(self):
+        """Число запросов post_detail не растёт с числом комментариев."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with CaptureQueriesContext(connection) as small_thread:
+            self.guest_client.get(url)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text='Комм')
+            for number in range(200)
+        )
+        cache.clear()
+        with CaptureQueriesContext(connection) as large_thread:
+            self.guest_client.get(url)
+        self.assertEqual(len(small_thread), len(large_thread))
@@ -0,0 +1,125 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter_user')
+        cls.reader = User.objects.create_user(username='counter_reader')
+        cls.group = Group.objects.create(
+            title='Тест',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Посты учитываются у автора и группы, в том числе при переносе."""
+        post = Post.objects.create(
+            author=self.user, text='Текст', group=self.group
+        )
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_and_follow_counters(self):
+        post = Post.objects.create(author=self.user, text='Текст')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.user).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_edit_keeps_counters_and_thumbnail(self):
+        """Сохранение загруженного раньше поста или группы не затирает
+        счётчики и миниатюру, записанные после загрузки."""
+        post = Post.objects.create(
+            author=self.user, text='Текст', group=self.group
+        )
+        group = Group.objects.get(pk=self.group.pk)
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        Post.objects.filter(pk=post.pk).update(thumbnail='thumbnails/1.jpg')
+        post.text = 'Правка'
+        post.save()
+        group.title = 'Новое название'
+        group.save()
+        client = Client()
+        client.force_login(self.user)
+        client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Правка через форму', 'group': self.group.pk},
+        )
+        post.refresh_from_db()
+        group.refresh_from_db()
+        self.assertEqual(post.text, 'Правка через форму')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.thumbnail, 'thumbnails/1.jpg')
+        self.assertEqual(group.title, 'Новое название')
+        self.assertEqual(group.posts_count, 1)
+
+    def test_profile_does_not_count_posts(self):
+        """Профиль берёт число постов из счётчика, а не из COUNT(*)."""
+        Post.objects.create(author=self.user, text='Текст')
+        url = reverse('posts:profile', kwargs={'username': 'counter_user'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(url)
+        self.assertEqual(response.context['author_stats'].posts_count, 1)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_reconcile_counters_fixes_drift(self):
+        Post.objects.create(author=self.user, text='Текст', group=self.group)
+        UserStats.objects.filter(user=self.user).update(posts_count=7)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=3)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('2', out.getvalue())
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
@@ -1,9 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
 
-from posts.models import Follow, Post
+from posts.models import Follow, Post, TimelineEntry
 
 User = get_user_model()
 
@@ -70,3 +70,90 @@ class PostFollowTests(TestCase):
             len(response_nonfollower.context['page_obj']),
             0
         )
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост сразу записывается в ленты подписчиков."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=post, pub_date=post.pub_date
+            ).exists()
+        )
+
+    def test_fan_out_to_many_followers(self):
+        """Раскладка на тысячу подписчиков укладывается в лимиты SQLite."""
+        User.objects.bulk_create(
+            User(username=f'reader_{number}') for number in range(1000)
+        )
+        readers = User.objects.filter(username__startswith='reader_')
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=self.author) for reader in readers
+        )
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertEqual(
+            TimelineEntry.objects.filter(post=post).count(), 1000
+        )
+
+    def test_follow_backfills_and_unfollow_drops(self):
+        """Подписка подтягивает старые посты, отписка их убирает."""
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower).count(), 1
+        )
+        self.follower_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'Author'})
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+
+    @override_settings(POSTS_TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты популярных авторов не пишутся в ленты, но видны в них."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.follower_client.get(reverse('posts:follow'))
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    @override_settings(POSTS_TIMELINE_BACKFILL=2)
+    def test_posts_older_than_backfill_are_read_on_demand(self):
+        """Подписка подтягивает не все посты, но в ленте видны все."""
+        for number in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower).count(), 2
+        )
+        response = self.follower_client.get(reverse('posts:follow'))
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_former_celebrity_posts_stay_visible(self):
+        """Посты, не разложенные, пока автор был "знаменитостью", не
+        пропадают из ленты, когда подписчиков становится меньше."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        with self.settings(POSTS_TIMELINE_FANOUT_LIMIT=0):
+            Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.follower_client.get(reverse('posts:follow'))
+        self.assertEqual(len(response.context['page_obj']), 2)
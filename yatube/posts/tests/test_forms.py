@@ -1,9 +1,18 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from posts.models import Group, Post, User
+from posts.uploads import LimitedTemporaryFileUploadHandler
 
 User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class FormTests(TestCase):
@@ -83,3 +92,72 @@ class FormTests(TestCase):
             ).exists()
         )
         self.assertEqual(Post.objects.count(), post_count)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadLimitsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def png(self, width, height):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'white').save(buffer, 'PNG')
+        return SimpleUploadedFile(
+            'upload.png', buffer.getvalue(), content_type='image/png'
+        )
+
+    def post_image(self, upload):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': upload},
+        )
+
+    def test_valid_image_is_accepted(self):
+        self.post_image(self.png(20, 10))
+        self.assertTrue(Post.objects.filter(author=self.user).exists())
+
+    @override_settings(POSTS_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_oversized_upload_is_rejected(self):
+        """Файл сверх лимита отклоняется с ошибкой формы."""
+        response = self.post_image(self.png(200, 200))
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'file_too_large'
+        ))
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_is_rejected(self):
+        response = self.post_image(self.png(20, 10))
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'too_many_pixels'
+        ))
+
+    def test_not_an_image_is_rejected(self):
+        response = self.post_image(SimpleUploadedFile(
+            'upload.png', b'not an image', content_type='image/png'
+        ))
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'invalid_image'
+        ))
+
+    @override_settings(POSTS_IMAGE_MAX_UPLOAD_SIZE=10)
+    def test_handler_keeps_nothing_beyond_limit(self):
+        """Обработчик пишет на диск не больше лимита, но знает размер."""
+        handler = LimitedTemporaryFileUploadHandler()
+        handler.new_file('image', 'upload.png', 'image/png', 25)
+        for start in range(0, 25, 5):
+            handler.receive_data_chunk(b'x' * 5, start)
+        upload = handler.file_complete(25)
+        self.assertEqual(upload.size, 25)
+        self.assertEqual(len(upload.read()), 10)
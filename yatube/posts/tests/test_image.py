@@ -1,10 +1,17 @@
+import shutil
 import tempfile
+from io import BytesIO
+
+from PIL import Image
 from django.core.cache import cache
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from posts import thumbnails
 from posts.models import Group, Post, User
 
 User = get_user_model()
@@ -91,3 +98,94 @@ class ImageTests(TestCase):
                 response = self.guest_client.get(address)
                 self.assertTemplateUsed(response, template)
                 self.assertEqual(post.image, 'posts/test.gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='thumb_author')
+        image = Image.new('RGB', (40, 20), 'red')
+        buffer = BytesIO()
+        image.save(buffer, 'GIF')
+        cls.image_name = default_storage.save(
+            'posts/thumb.gif', ContentFile(buffer.getvalue())
+        )
+        cls.post = Post.objects.create(
+            text='Пост с картинкой', author=cls.user, image=cls.image_name
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generate_stores_thumbnail_on_post(self):
+        """Миниатюра строится заранее и подставляется в ленту."""
+        thumbnails.generate(self.post.id, self.image_name)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail)
+        with Image.open(default_storage.path(self.post.thumbnail)) as thumb:
+            self.assertEqual(thumb.size, (960, 339))
+        response = self.client.get(reverse('posts:posts_index'))
+        self.assertContains(response, self.post.thumbnail_url)
+
+    def test_generate_refreshes_cached_post(self):
+        """Страница поста, закэшированная до миниатюры, обновляется."""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        self.client.get(url)
+        thumbnails.generate(self.post.id, self.image_name)
+        self.post.refresh_from_db()
+        self.assertContains(self.client.get(url), self.post.thumbnail_url)
+
+    def test_generate_refreshes_cached_feeds(self):
+        """Ленты из кэша страниц для анонимов получают миниатюру."""
+        group = Group.objects.create(
+            title='Тест', slug='thumb_slug', description='Описание'
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = group
+        post.save()
+        urls = [
+            reverse('posts:posts_index'),
+            reverse('posts:group_list', args=[group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        ]
+        for url in urls:
+            self.client.get(url)
+        thumbnails.generate(self.post.id, self.image_name)
+        self.post.refresh_from_db()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url), self.post.thumbnail_url
+                )
+
+    @override_settings(POSTS_IMAGE_WIDTHS=(480,),
+                       POSTS_IMAGE_FORMATS=('webp', 'jpeg'))
+    def test_variants_are_rendered_as_srcset(self):
+        """Все варианты лежат в хранилище и попадают в srcset."""
+        thumbnails.generate(self.post.id, self.image_name)
+        self.post.refresh_from_db()
+        sources = dict(self.post.image_sources)
+        self.assertIn('image/jpeg', sources)
+        for srcset in sources.values():
+            self.assertEqual(srcset.count('w,'), 1)
+        response = self.client.get(reverse('posts:posts_index'))
+        self.assertContains(response, 'srcset="{}"'.format(
+            sources['image/jpeg']
+        ))
+        base = thumbnails.variants_base(self.post.id, self.image_name)
+        with Image.open(default_storage.path(base + '_480w.jpg')) as thumb:
+            self.assertEqual(thumb.size, (480, 170))
+
+    def test_stale_result_is_dropped(self):
+        """Результат для заменённой картинки не записывается в пост."""
+        Post.objects.filter(pk=self.post.pk).update(image='posts/other.gif')
+        thumbnails.generate(self.post.id, self.image_name)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, '')
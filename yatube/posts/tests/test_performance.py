@@ -0,0 +1,188 @@
+import os
+import time
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.benchmark import percentile
+from .. import counters, timeline
+from ..search import get_backend
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# YATUBE_PERF_SCALE=full даёт объёмы, близкие к боевым; по умолчанию
+# набор данных небольшой, чтобы прогон укладывался в обычный CI.
+SCALES = {
+    'small': {'users': 50, 'posts': 1000, 'comments': 200},
+    'full': {'users': 5000, 'posts': 100000, 'comments': 2000},
+}
+SCALE = SCALES[os.environ.get('YATUBE_PERF_SCALE', 'small')]
+# Время ответа зависит от загрузки машины, поэтому бюджеты времени
+# проверяются только по явному YATUBE_PERF_TIMINGS=1; бюджеты запросов
+# проверяются всегда
+CHECK_TIMINGS = os.environ.get('YATUBE_PERF_TIMINGS') == '1'
+# Множитель бюджета времени для медленных машин
+BUDGET_FACTOR = float(os.environ.get('YATUBE_PERF_BUDGET_FACTOR', '1'))
+RUNS = 20
+
+# Максимум запросов к БД и p95 времени ответа (мс) на маршрут при
+# холодном кэше. Запросы сессии и пользователя входят в бюджет; объект
+# для ETag группы, профиля и поста view берёт уже из кэша объектов.
+BUDGETS = {
+    'posts:posts_index': (4, 150),
+    'posts:group_list': (4, 150),
+    'posts:profile': (6, 150),
+    'posts:post_detail': (5, 150),
+    'posts:post_create': (5, 100),
+    'posts:post_edit': (5, 100),
+    'posts:follow': (5, 150),
+    'posts:search': (5, 100),
+}
+
+
+@tag('performance')
+class QueryBudgetTests(TestCase):
+    """Бюджеты запросов и времени ответа для маршрутов posts/urls.py."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User.objects.bulk_create(
+            User(username=f'perf_user_{number}')
+            for number in range(SCALE['users'])
+        )
+        users = list(User.objects.order_by('id'))
+        cls.reader, cls.author = users[0], users[1]
+        cls.group = Group.objects.create(
+            title='Тест',
+            slug='perf_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            (
+                Post(
+                    author=users[number % len(users)],
+                    group=cls.group if number % 2 else None,
+                    text=f'Пост номер {number}',
+                )
+                for number in range(SCALE['posts'])
+            ),
+        )
+        cls.post = Post.objects.filter(author=cls.author).first()
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    post=cls.post,
+                    author=users[number % len(users)],
+                    text=f'Комментарий {number}',
+                )
+                for number in range(SCALE['comments'])
+            ),
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.reader, author=author) for author in users[1:20]
+        )
+        # bulk_create не вызывает сигналы: досчитываем вручную
+        counters.reconcile(User.objects.all())
+        timeline.rebuild(cls.reader.id)
+        get_backend().rebuild()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def urls(self):
+        return {
+            'posts:posts_index': reverse('posts:posts_index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            'posts:post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}
+            ),
+            'posts:post_create': reverse('posts:post_create'),
+            'posts:post_edit': reverse(
+                'posts:post_edit', kwargs={'post_id': self.post.id}
+            ),
+            'posts:follow': reverse('posts:follow'),
+            # Частое слово: совпадает с каждым постом набора
+            'posts:search': reverse('posts:search') + '?q=номер',
+        }
+
+    def measure(self, url):
+        timings = []
+        queries = 0
+        for run in range(RUNS):
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                self.client.get(url)
+                timings.append(time.perf_counter() - started)
+            queries = max(queries, len(captured))
+        return queries, percentile(timings, 95) * 1000
+
+    def test_routes_within_query_budget(self):
+        for name, url in self.urls().items():
+            max_queries, _ = BUDGETS[name]
+            queries, _ = self.measure(url)
+            with self.subTest(route=name):
+                self.assertLessEqual(queries, max_queries)
+
+    @tag('timing')
+    @skipUnless(CHECK_TIMINGS, 'бюджеты времени: YATUBE_PERF_TIMINGS=1')
+    def test_routes_within_time_budget(self):
+        for name, url in self.urls().items():
+            _, p95_budget = BUDGETS[name]
+            _, p95 = self.measure(url)
+            with self.subTest(route=name):
+                self.assertLessEqual(p95, p95_budget * BUDGET_FACTOR)
+
+    def test_revalidation_is_cheaper(self):
+        """Повторный запрос с ETag: 304 без тела и без запросов view."""
+        names = (
+            'posts:posts_index', 'posts:group_list', 'posts:profile',
+            'posts:post_detail', 'posts:follow',
+        )
+        urls = self.urls()
+        for name in names:
+            cache.clear()
+            with CaptureQueriesContext(connection) as full_queries:
+                full = self.client.get(urls[name])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    urls[name], HTTP_IF_NONE_MATCH=full['ETag']
+                )
+            with self.subTest(route=name):
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(len(response.content), 0)
+                self.assertGreater(len(full.content), 0)
+                # Только сессия и пользователь: объект для ETag в кэше
+                self.assertLessEqual(len(queries), 2)
+                self.assertLess(len(queries), len(full_queries))
+
+    def test_write_routes_within_budget(self):
+        """Запись комментария и подписки не зависит от объёма данных.
+
+        Комментарий переиндексирует для поиска только свой пост.
+        """
+        write_urls = {
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}): 9,
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username}): 10,
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username}): 14,
+        }
+        for url, max_queries in write_urls.items():
+            with CaptureQueriesContext(connection) as captured:
+                self.client.post(url, {'text': 'Комментарий'})
+            with self.subTest(url=url):
+                self.assertLessEqual(len(captured), max_queries)
@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+from ..search import COMMENTS_FTS_TABLE, get_backend, parse_terms
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='search_user', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Классика',
+            slug='classic',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def found(self, query):
+        response = self.guest_client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_parse_terms(self):
+        """Операторы и кавычки FTS5 из запроса отбрасываются."""
+        self.assertEqual(
+            parse_terms('Война AND "мир" OR*'), ['война', 'and', 'мир', 'or']
+        )
+        self.assertEqual(parse_terms(None), [])
+
+    def test_search_sources(self):
+        """Пост находится по тексту, комментарию, группе и автору."""
+        post = Post.objects.create(
+            author=self.user, text='Война и мир', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.user, text='Шедевр')
+        for query in ('война', 'шедевр', 'классика', 'толстой', 'мир войн'):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), [post])
+        self.assertEqual(self.found('анна'), [])
+        self.assertEqual(self.found('   '), [])
+
+    def test_index_follows_changes(self):
+        """Правки поста, комментариев, группы и автора попадают в индекс."""
+        post = Post.objects.create(author=self.user, text='Старый текст')
+        post.text = 'Новый текст'
+        post.group = self.group
+        post.save()
+        self.assertEqual(self.found('старый'), [])
+        self.assertEqual(self.found('новый'), [post])
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Замечание'
+        )
+        self.assertEqual(self.found('замечание'), [post])
+        comment.delete()
+        self.assertEqual(self.found('замечание'), [])
+        self.group.title = 'Проза'
+        self.group.save()
+        self.assertEqual(self.found('проза'), [post])
+        self.user.username = 'tolstoy'
+        self.user.save()
+        self.assertEqual(self.found('tolstoy'), [post])
+        post.delete()
+        self.assertEqual(self.found('новый'), [])
+
+    def test_comment_write_does_not_read_thread(self):
+        """Комментарий индексируется своей строкой: цена записи не
+        зависит от числа комментариев поста."""
+        post = Post.objects.create(author=self.user, text='Обсуждение')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text=f'Реплика {number}')
+            for number in range(50)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            Comment.objects.create(post=post, author=self.user, text='Итог')
+        search_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'posts_search' in query['sql']
+        ]
+        self.assertEqual(len(search_queries), 2)
+        self.assertTrue(all(
+            COMMENTS_FTS_TABLE in sql and 'posts_comment ' not in sql
+            for sql in search_queries
+        ))
+        self.assertEqual(self.found('итог'), [post])
+
+    def test_ranking_and_highlight(self):
+        """Совпадение в тексте важнее совпадения в комментарии."""
+        commented = Post.objects.create(author=self.user, text='Про погоду')
+        Comment.objects.create(
+            post=commented, author=self.user, text='Крыжовник'
+        )
+        matched = Post.objects.create(
+            author=self.user, text='<b>Крыжовник</b> созрел'
+        )
+        results = self.found('крыжовник')
+        self.assertEqual(results, [matched, commented])
+        self.assertIn(
+            '&lt;b&gt;<mark>Крыжовник</mark>&lt;/b&gt;',
+            results[0].search_snippet,
+        )
+
+    def test_pagination_keeps_query(self):
+        """Ссылки на страницы результатов сохраняют запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Повесть {i}') for i in range(12)
+        )
+        get_backend().rebuild()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'повесть', 'page': 2}
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertContains(response, '?q=%D0%BF%D0%BE%D0%B2%D0%B5')
+
+    @override_settings(POSTS_SEARCH_BACKEND='posts.search.SimpleBackend')
+    def test_simple_backend(self):
+        """Запасной бэкенд ищет без индекса и подсвечивает совпадения."""
+        post = Post.objects.create(author=self.user, text='Война и мир')
+        results = self.found('мир')
+        self.assertEqual(results, [post])
+        self.assertIn('<mark>мир</mark>', results[0].search_snippet)
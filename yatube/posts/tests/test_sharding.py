@@ -0,0 +1,152 @@
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Comment, Group, Post
+from ..paginators import CursorPaginator
+from ..sharding import ShardedFeed, ShardRouter, jump_hash, shard_for
+
+User = get_user_model()
+SHARDS = ['default', 'shard1', 'shard2']
+
+
+class JumpHashTests(SimpleTestCase):
+    def test_buckets_are_stable_and_even(self):
+        buckets = Counter(jump_hash(key, 4) for key in range(4000))
+        self.assertEqual(set(buckets), {0, 1, 2, 3})
+        self.assertGreater(min(buckets.values()), 800)
+        self.assertEqual(jump_hash(12345, 4), jump_hash(12345, 4))
+
+    def test_new_bucket_takes_keys_only_for_itself(self):
+        """Новый шард забирает около 1/n ключей и только себе."""
+        moved = 0
+        for key in range(4000):
+            before, after = jump_hash(key, 3), jump_hash(key, 4)
+            if before != after:
+                moved += 1
+                self.assertEqual(after, 3)
+        self.assertLess(abs(moved - 1000), 200)
+
+
+@override_settings(POSTS_SHARDS=SHARDS)
+class ShardRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ShardRouter()
+        self.author = User(pk=7, username='sharded')
+
+    def test_new_post_goes_to_author_shard(self):
+        post = Post(author=self.author, text='Пост')
+        self.assertEqual(
+            self.router.db_for_write(Post, instance=post), shard_for(7)
+        )
+
+    def test_comment_follows_post(self):
+        post = Post(pk=1, author=self.author)
+        post._state.adding = False
+        post._state.db = 'shard2'
+        comment = Comment(post=post, author=self.author)
+        self.assertEqual(
+            self.router.db_for_write(Comment, instance=comment), 'shard2'
+        )
+        self.assertEqual(
+            self.router.db_for_read(Comment, instance=post), 'shard2'
+        )
+
+    def test_author_posts_read_from_author_shard(self):
+        self.assertEqual(
+            self.router.db_for_read(Post, instance=self.author), shard_for(7)
+        )
+        self.assertIsNone(
+            self.router.db_for_read(Comment, instance=self.author)
+        )
+        self.assertIsNone(self.router.db_for_read(User, instance=self.author))
+
+    def test_manager_writes_go_to_shard(self):
+        """create() и get_or_create() без using() пишут на шард объекта."""
+        post = Post(pk=1, author=self.author)
+        post._state.adding = False
+        post._state.db = 'shard2'
+        with mock.patch.object(QuerySet, 'create', autospec=True) as create:
+            Post.objects.create(author=self.author, text='Пост')
+            Comment.objects.create(post=post, author=self.author, text='К')
+        self.assertEqual(
+            [call[0][0].db for call in create.call_args_list],
+            [shard_for(7), 'shard2'],
+        )
+        with mock.patch.object(
+            QuerySet, 'get_or_create', autospec=True
+        ) as get_or_create:
+            Post.objects.get_or_create(author_id=7, text='Пост')
+        self.assertEqual(get_or_create.call_args[0][0].db, shard_for(7))
+
+    def test_unroutable_manager_writes_are_rejected(self):
+        with self.assertRaises(ValueError):
+            Post.objects.create(text='Без автора')
+        with self.assertRaises(ValueError):
+            Post.objects.bulk_create([Post(author=self.author, text='П')])
+
+    @override_settings(POSTS_SHARDS=['default'])
+    def test_single_shard_defers_to_other_routers(self):
+        post = Post(author=self.author)
+        self.assertIsNone(self.router.db_for_write(Post, instance=post))
+
+
+class ShardedFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(username=f'feed_author{number}')
+            for number in range(3)
+        ]
+        cls.group = Group.objects.create(
+            title='Тест', slug='feed_slug', description='Описание'
+        )
+        start = timezone.now()
+        for number in range(12):
+            post = Post.objects.create(
+                author=cls.authors[number % 3], text=f'Пост {number}',
+                group=cls.group if number % 2 else None,
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=start + timedelta(minutes=number // 2)
+            )
+
+    def feed(self):
+        # Запрос на каждого автора стоит в роли отдельного шарда
+        return ShardedFeed(
+            Post.objects.filter(author=author) for author in self.authors
+        )
+
+    def test_merge_matches_single_query(self):
+        """Слияние голов шардов даёт тот же порядок, что и один запрос."""
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        feed = self.feed()
+        self.assertEqual(feed.count(), 12)
+        self.assertEqual(list(feed), expected)
+        self.assertEqual(feed[3:8], expected[3:8])
+        self.assertEqual(feed[5], expected[5])
+        grouped = feed.filter(group=self.group)
+        self.assertEqual(
+            grouped[:3], list(Post.objects.filter(group=self.group)[:3])
+        )
+
+    def test_paginators(self):
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        page = Paginator(self.feed(), 5).get_page(3)
+        self.assertEqual(list(page), expected[10:])
+        paginator = CursorPaginator(self.feed(), 5)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(list(second), expected[5:10])
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), expected[:5])
+
+    def test_mixed_ordering_is_rejected(self):
+        with self.assertRaises(ValueError):
+            list(self.feed().order_by('-pub_date', 'id'))
@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import QuerySet
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+from ..search import get_backend
+from ..transfer import bulk_create_keeping_dates
+
+User = get_user_model()
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.workdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='transfer_author')
+        self.reader = User.objects.create_user(username='transfer_reader')
+        self.group = Group.objects.create(
+            title='Тест', slug='transfer_slug', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, text='Перенос', group=self.group
+        )
+        self.pub_date = datetime(2020, 1, 2, 3, 4, 5, 678901, timezone.utc)
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.pub_date)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def call(self, *args):
+        call_command(*args, stdout=StringIO(), stderr=StringIO())
+
+    def roundtrip(self, extension):
+        for kind in ('group', 'post', 'comment', 'follow'):
+            self.call('export_data', kind, self.path(kind + extension))
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        for kind in ('group', 'post', 'comment', 'follow'):
+            self.call('import_data', kind, self.path(kind + extension))
+
+    def assert_restored(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Перенос')
+        self.assertEqual(post.pub_date, self.pub_date)
+        self.assertEqual(post.author.username, 'transfer_author')
+        self.assertEqual(post.group.slug, 'transfer_slug')
+        self.assertEqual(post.comments.get().author.username,
+                         'transfer_reader')
+        self.assertTrue(Follow.objects.filter(
+            user__username='transfer_reader',
+            author__username='transfer_author',
+        ).exists())
+
+    def test_jsonl_roundtrip(self):
+        """Выгрузка и загрузка JSONL сохраняют ключи, даты и связи."""
+        self.roundtrip('.jsonl')
+        self.assert_restored()
+
+    def test_dates_kept_without_touching_model(self):
+        """Даты из файла сохраняются, а auto_now_add у поля не
+        выключается - параллельные сохранения получают своё время."""
+        field = Post._meta.get_field('pub_date')
+        bulk_create = QuerySet.bulk_create
+        flags = []
+
+        def check_flag(queryset, *args, **kwargs):
+            flags.append(field.auto_now_add)
+            return bulk_create(queryset, *args, **kwargs)
+
+        posts = [
+            Post(pk=1000, author=self.author, text='Старый',
+                 pub_date=self.pub_date),
+            Post(pk=1001, author=self.author, text='Без даты'),
+        ]
+        with mock.patch.object(QuerySet, 'bulk_create', check_flag):
+            bulk_create_keeping_dates(Post.objects.all(), posts)
+        self.assertEqual(flags, [True])
+        self.assertEqual(Post.objects.get(pk=1000).pub_date, self.pub_date)
+        self.assertGreater(
+            Post.objects.get(pk=1001).pub_date, self.pub_date
+        )
+
+    def test_csv_roundtrip(self):
+        """CSV переносит те же данные, пустая группа остаётся пустой."""
+        Post.objects.create(author=self.author, text='Без группы')
+        self.roundtrip('.csv')
+        self.assert_restored()
+        self.assertIsNone(Post.objects.get(text='Без группы').group)
+
+    def test_derived_data_rebuilt(self):
+        """После загрузки пересчитаны счётчики, ленты и поиск."""
+        self.roundtrip('.jsonl')
+        reader = User.objects.get(username='transfer_reader')
+        author = User.objects.get(username='transfer_author')
+        self.assertEqual(UserStats.objects.get(user=author).posts_count, 1)
+        self.assertEqual(Post.objects.get().comments_count, 1)
+        self.assertEqual(Group.objects.get().posts_count, 1)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post_id=self.post.pk)
+        )
+        self.assertEqual(
+            list(get_backend().search('перенос')[:10]), [self.post]
+        )
+
+    def test_resume(self):
+        """Повторная загрузка и продолжение с --start не дублируют строки."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(5)
+        )
+        path = self.path('posts.jsonl')
+        self.call('export_data', 'post', path)
+        Post.objects.filter(text__startswith='Пост ').delete()
+        self.call('import_data', 'post', path, '--start', '3',
+                  '--batch-size', '2')
+        self.assertEqual(Post.objects.count(), 4)
+        self.call('import_data', 'post', path, '--batch-size', '2')
+        self.assertEqual(Post.objects.count(), 6)
+
+    def test_colliding_ids_are_skipped_and_reported(self):
+        """Строки с занятыми id не трогают существующие посты."""
+        path = self.path('colliding.jsonl')
+        self.call('export_data', 'post', path)
+        own_date = datetime(2021, 5, 6, tzinfo=timezone.utc)
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Свой пост', pub_date=own_date
+        )
+        stdout = StringIO()
+        call_command('import_data', 'post', path, stdout=stdout,
+                     stderr=StringIO())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Свой пост')
+        self.assertEqual(post.pub_date, own_date)
+        self.assertIn('загружено 0 строк', stdout.getvalue())
+        self.assertIn('пропущено 1 строк', stdout.getvalue())
+
+    def test_failure_reports_position(self):
+        """Ошибка в данных сообщает, с какой строки продолжить."""
+        path = self.path('broken.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write('{"id": 900, "title": "А", "slug": "a", '
+                         '"description": ""}\n')
+            stream.write('{"id": 901, "title": "Б", "slug": "b", '
+                         '"description": ""}\n')
+            stream.write('not json\n')
+        with self.assertRaisesRegex(CommandError, '--start 2'):
+            self.call('import_data', 'group', path, '--batch-size', '2')
+        self.assertTrue(Group.objects.filter(pk=900).exists())
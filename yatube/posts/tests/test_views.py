@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.cache import cache
 from ..models import Group, Post
@@ -176,3 +178,57 @@ class PostPaginatorTests(TestCase):
         for template, reverse_name in paginator_list.items():
             response = self.guest_client.get(reverse_name)
             self.assertEqual(len(response.context['page_obj']), 3)
+
+
+@override_settings(POSTS_CURSOR_PAGINATION=True)
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor_user')
+        for count_post in range(13):
+            Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.url = reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        )
+
+    def test_pages_follow_cursor_links(self):
+        """Курсоры ведут вперёд и назад без пропусков и повторов."""
+        first_page = self.guest_client.get(self.url).context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        second_page = self.guest_client.get(
+            self.url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        ids = [post.id for post in list(first_page) + list(second_page)]
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        back_page = self.guest_client.get(
+            self.url, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.id for post in back_page],
+            [post.id for post in first_page],
+        )
+
+    def test_cursor_page_skips_count(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse('posts:posts_index'))
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.guest_client.get(self.url, {'cursor': 'broken'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(response.context['page_obj'].has_previous())
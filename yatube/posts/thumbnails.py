@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+from core.objectcache import invalidate
+
+from . import imaging
+from .caching import (
+    FEED, POSTS_KEY, author_key, bump_generation, group_key, post_key, purge,
+)
+from .models import Post
+from .sharding import is_sharded, shards
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def variants_base(post_id, image_name):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'thumbnails/{post_id}/{stem}'
+
+
+def _widths():
+    # Ширина ленты нужна всегда: её JPEG служит src по умолчанию
+    return sorted({*settings.POSTS_IMAGE_WIDTHS, imaging.FEED_SIZE[0]})
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POSTS_THUMBNAIL_WORKERS
+        )
+    return _executor
+
+
+def _store(post_id, image_name, base, variants):
+    thumbnail = imaging.variant_name(base, imaging.FEED_SIZE[0], 'jpeg')
+    variants['b'] = base
+    # Картинку могли заменить, пока шла обработка: тогда результат лишний
+    # Шард поста заранее неизвестен: обновляем там, где он найдётся
+    aliases = shards() if is_sharded() else [None]
+    for alias in aliases:
+        posts = Post.objects.db_manager(alias).filter(pk=post_id)
+        updated = posts.filter(image=image_name).update(
+            thumbnail=thumbnail,
+            image_variants=json.dumps(variants, separators=(',', ':')),
+        )
+        if updated:
+            break
+    else:
+        return
+    invalidate(Post, post_id)
+    # Карточка поста есть и в лентах: главной, группы и профиля автора
+    keys = [post_key(post_id)]
+    row = posts.values_list('author_id', 'group_id').first()
+    if row is not None:
+        author_id, group_id = row
+        keys += [
+            POSTS_KEY, author_key(author_id), group_id and group_key(group_id)
+        ]
+    purge(*keys)
+    bump_generation(FEED)
+
+
+def _on_done(post_id, image_name, base, future):
+    try:
+        _store(post_id, image_name, base, future.result())
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюру поста %s', post_id)
+    finally:
+        # Колбэк выполняется в служебном потоке пула со своими соединениями
+        connections.close_all()
+
+
+def _job(post_id, image_name):
+    base = variants_base(post_id, image_name)
+    args = (
+        default_storage.path(image_name),
+        default_storage.path(base),
+        _widths(),
+        settings.POSTS_IMAGE_FORMATS,
+    )
+    return base, args
+
+
+def generate(post_id, image_name):
+    """Синхронно строит варианты картинки и записывает их в пост."""
+    base, args = _job(post_id, image_name)
+    _store(post_id, image_name, base, imaging.render_variants(*args))
+
+
+def submit(post_id, image_name):
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        return generate(post_id, image_name)
+    base, args = _job(post_id, image_name)
+    future = _get_executor().submit(imaging.render_variants, *args)
+    future.add_done_callback(partial(_on_done, post_id, image_name, base))
+    return future
+
+
+def schedule(post):
+    """Ставит картинку в очередь пула после фиксации транзакции."""
+    if post.image:
+        transaction.on_commit(partial(submit, post.pk, post.image.name))
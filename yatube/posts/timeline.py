@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.db.models import Q
+
+from .counters import count_for_user
+from .models import Follow, Post, TimelineEntry, UserStats
+from .sharding import is_sharded
+from .utils import chunked
+
+
+def is_celebrity(author_id):
+    """Посты такого автора не раскладываются по лентам при записи."""
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.POSTS_TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def read_on_demand(author_id):
+    """Не все посты автора есть в лентах: с этих пор follow_index
+    подмешивает их при чтении."""
+    stats = UserStats.objects.filter(user_id=author_id)
+    if stats.filter(timeline_on_read=True).exists():
+        return
+    if not stats.update(timeline_on_read=True):
+        UserStats.objects.get_or_create(
+            user_id=author_id,
+            defaults={**count_for_user(author_id), 'timeline_on_read': True},
+        )
+
+
+def _write(entries):
+    # Пачки режутся здесь, а не через batch_size: внутри пачки Django
+    # сам соблюдает лимиты SQLite на число параметров и UNION ALL
+    for chunk in chunked(entries, settings.POSTS_TIMELINE_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    if is_celebrity(post.author_id):
+        read_on_demand(post.author_id)
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _write(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in follower_ids
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту свежие посты автора после подписки на него."""
+    if is_celebrity(author_id):
+        read_on_demand(author_id)
+        return
+    limit = settings.POSTS_TIMELINE_BACKFILL
+    posts = list(Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )[:limit + 1])
+    if len(posts) > limit:
+        # Более старые посты дочитываются при открытии ленты
+        read_on_demand(author_id)
+        posts = posts[:limit]
+    _write(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def drop(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_id):
+    """Пересобирает ленту читателя с нуля по текущим подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    author_ids = Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    )
+    for author_id in author_ids:
+        backfill(user_id, author_id)
+
+
+def timeline_posts(user):
+    """Посты избранных авторов для follow_index.
+
+    Обычные авторы читаются из материализованной ленты по индексу
+    (user, -pub_date). Посты авторов, разложенные не полностью (у
+    "знаменитостей" с огромным числом подписчиков или у авторов с
+    постами старше POSTS_TIMELINE_BACKFILL), подмешиваются при чтении.
+    При шардировании лента целиком собирается при чтении.
+    """
+    if is_sharded():
+        # Посты разных авторов лежат на разных шардах: лента собирается
+        # с шардов подписок при чтении
+        return Post.objects.for_authors(
+            Follow.objects.filter(user=user).values_list(
+                'author_id', flat=True
+            )
+        )
+    on_read_ids = list(
+        Follow.objects.filter(
+            user=user, author__stats__timeline_on_read=True,
+        ).values_list('author_id', flat=True)
+    )
+    if not on_read_ids:
+        return Post.objects.filter(
+            timeline_entries__user=user
+        ).order_by('-timeline_entries__pub_date')
+    timeline = TimelineEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.filter(
+        Q(id__in=timeline) | Q(author_id__in=on_read_ids)
+    )
@@ -0,0 +1,250 @@
+"""Потоковый импорт и экспорт данных posts в JSONL и CSV.
+
+Строки читаются и пишутся по одной, в базу уходят пачками bulk_create
+в отдельных транзакциях, поэтому расход памяти не зависит от объёма
+файла. Первичные ключи сохраняются: повторный импорт того же файла
+пропускает уже загруженные строки, и прерванную загрузку можно
+продолжить с любого места.
+"""
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+
+from . import counters, timeline
+from .caching import FEED, bump_generation
+from .models import Comment, Follow, Group, Post
+from .search import get_backend
+from .utils import chunked
+
+User = get_user_model()
+
+# Столбцы файла для каждой модели. Пользователи переносятся по username,
+# остальные связи - по первичному ключу.
+SPECS = {
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (Post, ('id', 'text', 'pub_date', 'author', 'group', 'image')),
+    'comment': (Comment, ('id', 'post', 'author', 'text', 'created')),
+    'follow': (Follow, ('id', 'user', 'author')),
+}
+# Порядок загрузки, при котором связи уже существуют
+KINDS = ('group', 'post', 'comment', 'follow')
+FORMATS = ('jsonl', 'csv')
+
+
+def detect_format(path, fmt=None):
+    """Формат из опции или по расширению файла; по умолчанию JSONL."""
+    if fmt:
+        return fmt
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def _is_user_field(field):
+    return field.is_relation and field.related_model is User
+
+
+def _export_lookup(field):
+    if _is_user_field(field):
+        return f'{field.name}__username'
+    return field.attname
+
+
+def export_rows(kind, after_id=0):
+    """Строки модели по возрастанию id, начиная после after_id."""
+    model, columns = SPECS[kind]
+    lookups = [
+        _export_lookup(model._meta.get_field(column)) for column in columns
+    ]
+    rows = model.objects.filter(pk__gt=after_id).order_by('pk').values_list(
+        *lookups
+    )
+    for values in rows.iterator():
+        yield dict(zip(columns, values))
+
+
+def _json_default(value):
+    # Даты - с микросекундами: от них зависит порядок лент
+    return value.isoformat()
+
+
+def write_rows(rows, stream, fmt, columns, header=True):
+    """Пишет строки в поток и отдаёт их дальше для подсчёта."""
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=columns)
+        if header:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield row
+        return
+    for row in rows:
+        stream.write(json.dumps(
+            row, ensure_ascii=False, default=_json_default
+        ) + '\n')
+        yield row
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+class _Users:
+    """Кэш username -> id; незнакомые авторы создаются без пароля."""
+
+    def __init__(self):
+        self.ids = {}
+
+    def resolve(self, usernames):
+        missing = set(usernames) - self.ids.keys()
+        if not missing:
+            return
+        self.ids.update(
+            User.objects.filter(username__in=missing).values_list(
+                'username', 'id'
+            )
+        )
+        missing -= self.ids.keys()
+        if not missing:
+            return
+        User.objects.bulk_create(
+            User(username=username, password=make_password(None))
+            for username in missing
+        )
+        self.ids.update(
+            User.objects.filter(username__in=missing).values_list(
+                'username', 'id'
+            )
+        )
+
+
+# Столько строк за один UPDATE ... CASE: по три параметра на строку
+# укладываются в лимит SQLite на число параметров
+DATES_BATCH_SIZE = 250
+
+
+def _existing_pks(queryset, pks):
+    existing = set()
+    for chunk in chunked(pks, DATES_BATCH_SIZE):
+        existing.update(
+            queryset.filter(pk__in=chunk).values_list('pk', flat=True)
+        )
+    return existing
+
+
+def bulk_create_keeping_dates(queryset, objects):
+    """bulk_create, после которого даты auto_now_add берутся из объектов.
+
+    bulk_create ставит в такие поля текущее время. Отключать auto_now_add
+    у поля нельзя: модель общая для всех потоков процесса, и параллельные
+    сохранения получили бы пустые даты. Поэтому даты возвращаются одним
+    UPDATE ... CASE на пачку - только у вставленных строк: строки, чей
+    ключ уже занят, пропускаются и не трогаются. Объекты должны быть с
+    первичными ключами; возвращается число пропущенных.
+    """
+    model = queryset.model
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    existing = _existing_pks(queryset, [obj.pk for obj in objects])
+    objects = [obj for obj in objects if obj.pk not in existing]
+    # Даты - до вставки: bulk_create заменит их в самих объектах
+    dates = [
+        (obj.pk, [getattr(obj, field.attname) for field in fields])
+        for obj in objects
+    ]
+    # Остальные уникальные ограничения (slug группы, пара подписки)
+    # тоже могут отклонить строку - её пропускает ignore_conflicts
+    queryset.bulk_create(objects, ignore_conflicts=True)
+    inserted = _existing_pks(queryset, [obj.pk for obj in objects])
+    skipped = len(existing) + len(objects) - len(inserted)
+    dates = [(pk, values) for pk, values in dates if pk in inserted]
+    if not fields:
+        return skipped
+    for chunk in chunked(dates, DATES_BATCH_SIZE):
+        queryset.filter(pk__in=[pk for pk, _ in chunk]).update(**{
+            field.attname: Case(
+                *(
+                    When(pk=pk, then=Value(values[number]))
+                    for pk, values in chunk
+                    if values[number] is not None
+                ),
+                # Даты не было в файле - остаётся время загрузки
+                default=F(field.attname),
+                output_field=field.__class__(),
+            )
+            for number, field in enumerate(fields)
+        })
+    return skipped
+
+
+def import_rows(kind, rows, batch_size):
+    """Загружает строки пачками.
+
+    После каждой пачки отдаёт (обработано строк, из них пропущено):
+    пропускаются строки, чей id или уникальное поле уже есть в базе.
+    """
+    model, columns = SPECS[kind]
+    fields = [model._meta.get_field(column) for column in columns]
+    user_fields = [field for field in fields if _is_user_field(field)]
+    users = _Users()
+    done = skipped = 0
+    for chunk in chunked(rows, batch_size):
+        users.resolve(
+            row[field.name] for row in chunk for field in user_fields
+        )
+        objects = [
+            model(**{
+                field.attname: _import_value(field, row, users)
+                for field in fields
+                if field.name in row
+            })
+            for row in chunk
+        ]
+        with transaction.atomic():
+            skipped += bulk_create_keeping_dates(model.objects.all(), objects)
+        done += len(chunk)
+        yield done, skipped
+    _reset_sequence(model)
+
+
+def _import_value(field, row, users):
+    value = row[field.name]
+    if _is_user_field(field):
+        return users.ids[value]
+    if value in ('', None) and field.null:
+        return None
+    return field.to_python(value)
+
+
+def _reset_sequence(model):
+    # Ключи пришли из файла: счётчик автоинкремента в PostgreSQL нужно
+    # сдвинуть за максимальный id (SQLite делает это сам)
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def rebuild_derived():
+    """Досчитывает то, что при bulk_create не обновили сигналы."""
+    with transaction.atomic():
+        counters.reconcile(User.objects.all())
+    readers = Follow.objects.order_by().values_list(
+        'user_id', flat=True
+    ).distinct()
+    for user_id in list(readers):
+        with transaction.atomic():
+            timeline.rebuild(user_id)
+    get_backend().rebuild()
+    bump_generation(FEED)
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск кусками и ничего не хранит сверх лимита.
+
+    Остаток слишком большого файла только подсчитывается, поэтому ни
+    память, ни диск не растут вместе с размером запроса; итоговый size
+    остаётся настоящим, и форма отклоняет такой файл.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) <= settings.POSTS_IMAGE_MAX_UPLOAD_SIZE:
+            self.file.write(raw_data)
+
+
+def validate_image_upload(upload):
+    """Проверяет размер, формат и число пикселей по заголовку файла.
+
+    Image.open читает только заголовок, пиксели не декодируются.
+    """
+    max_size = settings.POSTS_IMAGE_MAX_UPLOAD_SIZE
+    if upload.size > max_size:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': max_size // (1024 * 1024)},
+        )
+    position = upload.tell()
+    try:
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+    finally:
+        upload.seek(position)
+    if image_format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.',
+            code='invalid_format',
+            params={'format': image_format},
+        )
+    if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение %(width)dx%(height)d слишком большое.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
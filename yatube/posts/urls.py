@@ -17,6 +17,7 @@ urlpatterns = [
          views.add_comment,
          name='add_comment'
          ),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow'),
     path(
         'profile/<str:username>/follow/',
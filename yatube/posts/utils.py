@@ -0,0 +1,30 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from .paginators import CursorPaginator
+
+
+def paginate(request, queryset, per_page, count=None):
+    """Возвращает страницу ленты в режиме, выбранном в настройках.
+
+    count - заранее известное число объектов (денормализованный счётчик),
+    с ним постраничный Paginator не выполняет COUNT(*).
+    """
+    if settings.POSTS_CURSOR_PAGINATION:
+        paginator = CursorPaginator(queryset, per_page)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = Paginator(queryset, per_page)
+    if count is not None:
+        paginator.count = count
+    return paginator.get_page(request.GET.get('page'))
+
+
+def chunked(iterable, size):
+    """Режет поток на списки по size элементов, не читая его целиком."""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
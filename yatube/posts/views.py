@@ -1,49 +1,148 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import get_object_or_404, render, redirect
 from django.core.paginator import Paginator
-from django.contrib.auth import get_user_model
+from django.shortcuts import render, redirect
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from core.objectcache import get_or_404
+from core.stampede import get_or_compute
 
-from .models import Follow, Group, Post
+from . import objects, thumbnails
+from .models import Comment, Follow, Post
+from .caching import (
+    FEED, POSTS_KEY, WRITES, author_key, comments_scope, get_generation,
+    group_key, keys_version, post_key, tag_response,
+)
+from .counters import stats_for
 from .forms import CommentForm, PostForm
+from .search import get_backend
+from .sharding import get_post
+from .timeline import timeline_posts
+from .utils import paginate
 
 NUMBER_OF_POSTS = 10
-User = get_user_model()
 
 
+def listed_keys(page_obj):
+    """Суррогатные ключи авторов и групп постов на странице ленты."""
+    keys = set()
+    for post in page_obj:
+        keys.add(author_key(post.author_id))
+        if post.group_id:
+            keys.add(group_key(post.group_id))
+    return sorted(keys)
+
+
+def _cached(object_cache, value):
+    try:
+        return object_cache.get(value)
+    except object_cache.model.DoesNotExist:
+        return None
+
+
+def _etag(request, *keys):
+    # Страница зависит и от того, кто её смотрит
+    etag = f'{request.user.pk or 0}-{keys_version(keys)}'
+    if request.user.is_authenticated:
+        # В формах страницы - CSRF-токен, а он меняется при входе:
+        # страница из кэша браузера со старым токеном дала бы 403
+        # (get_token заводит его сразу, если cookie ещё нет)
+        get_token(request)
+        token = request.META['CSRF_COOKIE']
+        etag += '-' + hashlib.md5(token.encode()).hexdigest()[:8]
+    return etag
+
+
+# ETag считается до основных запросов view: по версиям суррогатных
+# ключей и объекту из кэша объектов. Совпал - сразу 304.
+def index_etag(request):
+    return _etag(request, POSTS_KEY)
+
+
+def group_etag(request, slug):
+    group = _cached(objects.groups, slug)
+    return _etag(request, group_key(group.id)) if group else None
+
+
+def profile_etag(request, username):
+    author = _cached(objects.authors, username)
+    return _etag(request, author_key(author.id)) if author else None
+
+
+def post_detail_etag(request, post_id):
+    post = _cached(objects.posts, post_id)
+    if post is None:
+        return None
+    return _etag(
+        request,
+        post_key(post.id),
+        author_key(post.author_id),
+        post.group_id and group_key(post.group_id),
+    )
+
+
+def follow_etag(request):
+    # Лента подписок меняется от записей многих авторов сразу
+    return f'{request.user.pk}-{get_generation(WRITES)}'
+
+
+@condition(etag_func=index_etag)
 def index(request):
-    post_list = Post.objects.select_related().all()
-    paginator = Paginator(post_list, NUMBER_OF_POSTS)
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get('page')
-    # Получаем набор записей для страницы с запрошенным номером
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related(
+        'author', 'group'
+    ).across_shards()
+    feed_version = get_generation(FEED)
+    # COUNT(*) по всем постам считается один раз на поколение ленты,
+    # а не каждым запросом, пришедшим сразу после новой записи
+    count = None
+    if not settings.POSTS_CURSOR_PAGINATION:
+        count = get_or_compute(
+            'posts:count', post_list.count,
+            settings.POSTS_FEED_CACHE_TIMEOUT, version=feed_version,
+        )
+    # Номер страницы (или курсор) берётся из GET-параметров запроса
+    page_obj = paginate(request, post_list, NUMBER_OF_POSTS, count=count)
     # Отдаем в словаре контекста
     context = {
         'page_obj': page_obj,
+        # Поколение ленты входит в ключ кэша: любая запись его меняет
+        'feed_version': feed_version,
+        'feed_cache_timeout': settings.POSTS_FEED_CACHE_TIMEOUT,
     }
-    return render(request, 'posts/index.html', context)
+    response = render(request, 'posts/index.html', context)
+    return tag_response(response, POSTS_KEY, *listed_keys(page_obj))
 
 
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author', 'group')
-
-    group_paginator = Paginator(posts, NUMBER_OF_POSTS)
-    group_page_number = request.GET.get('page')
-    group_page_obj = group_paginator.get_page(group_page_number)
+    group = get_or_404(objects.groups, slug)
+    posts = group.posts.select_related('author', 'group').across_shards()
+    group_page_obj = paginate(
+        request, posts, NUMBER_OF_POSTS, count=group.posts_count
+    )
     context = {
         'group': group,
         'page_obj': group_page_obj,
     }
-    return render(request, 'posts/group_list.html', context)
+    response = render(request, 'posts/group_list.html', context)
+    return tag_response(
+        response, group_key(group.id), *listed_keys(group_page_obj)
+    )
 
 
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_or_404(objects.authors, username)
+    author_stats = stats_for(author)
     posts = author.posts.select_related('group', 'author')
-    paginator = Paginator(posts, NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(
+        request, posts, NUMBER_OF_POSTS, count=author_stats.posts_count
+    )
     is_following = (
         request.user.is_authenticated and Follow.objects.filter(
             author=author,
@@ -51,28 +150,60 @@ def profile(request, username):
     )
     context = {
         'author': author,
+        'author_stats': author_stats,
         'page_obj': page_obj,
         "following": is_following,
     }
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    return tag_response(
+        response, author_key(author.id), *listed_keys(page_obj)
+    )
 
 
+@condition(etag_func=post_detail_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    posts_count = Post.objects.all().count()
+    post = get_or_404(objects.posts, post_id)
+    posts_count = stats_for(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments_list = post.comments.all()
+    comments_list = Comment.objects.for_post(post).window(
+        after=request.GET.get('comments_after')
+    )
     context = {
         'post': post,
         'posts_count': posts_count,
         'form': form,
         'comments': comments_list,
+        'comments_version': get_generation(comments_scope(post.id)),
+        'comments_cache_timeout': settings.POSTS_COMMENTS_CACHE_TIMEOUT,
+    }
+    response = render(request, 'posts/post_detail.html', context)
+    # Автор нужен из-за числа его постов, группа - из-за её названия
+    return tag_response(
+        response,
+        post_key(post.id),
+        author_key(post.author_id),
+        post.group_id and group_key(post.group_id),
+    )
+
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    # Результаты упорядочены по релевантности, поэтому здесь обычный
+    # Paginator по номерам страниц, а не курсор по дате
+    results = get_backend().search(query)
+    page_obj = Paginator(results, NUMBER_OF_POSTS).get_page(
+        request.GET.get('page')
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'query_prefix': urlencode({'q': query}) + '&' if query else '',
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request, post_id=None):
     form = PostForm(
         request.POST or None,
@@ -86,13 +217,15 @@ def post_create(request, post_id=None):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    thumbnails.schedule(post)
     return redirect('posts:profile', username=request.user)
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
-    post = Post.objects.get(pk=post_id)
-    if post.author != request.user:
+    post = get_post(Post.objects.all(), pk=post_id)
+    if post.author_id != request.user.id:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
         request.POST or None,
@@ -100,7 +233,16 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        image_changed = 'image' in form.changed_data
+        post = form.save(commit=False)
+        update_fields = post.editable_fields()
+        if image_changed:
+            # Миниатюры прежней картинки больше не годятся
+            post.thumbnail = post.image_variants = ''
+            update_fields += ['thumbnail', 'image_variants']
+        post.save(update_fields=update_fields)
+        if image_changed:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
 
     context = {'form': form, 'is_edit': True, 'post': post}
@@ -108,9 +250,10 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     # Получите пост
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_or_404(objects.posts, post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -121,29 +264,29 @@ def add_comment(request, post_id):
 
 
 @login_required
+@condition(etag_func=follow_etag)
 def follow_index(request):
-
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = timeline_posts(request.user).select_related('author', 'group')
+    page_obj = paginate(request, posts, NUMBER_OF_POSTS)
     context = {
         'page_obj': page_obj,
-        'paginator': paginator,
+        'paginator': page_obj.paginator,
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_or_404(objects.authors, username)
     if author != request.user:
         Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_or_404(objects.authors, username)
     Follow.objects.get(user=request.user, author=author).delete()
     return redirect('posts:profile', username)
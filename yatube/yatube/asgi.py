@@ -0,0 +1,16 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 не умеет ASGI сам, поэтому WSGI-приложение оборачивается
+мостом core.asgi.WsgiToAsgi. Запуск: uvicorn yatube.asgi:application
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+from core.asgi import WsgiToAsgi  # noqa: E402
+
+application = WsgiToAsgi(get_wsgi_application())
@@ -0,0 +1,10 @@
+"""Профиль настроек выбирается переменной YATUBE_SETTINGS: dev или prod.
+
+По умолчанию - dev, как для разработки и тестов.
+"""
+import os
+
+if os.environ.get('YATUBE_SETTINGS', 'dev') == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    from .dev import *  # noqa: F401,F403
@@ -0,0 +1,308 @@
+"""Общие настройки всех профилей; профили - dev.py и prod.py."""
+import os
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'y9yh^4u)m(%wj2&adv9m2piow(ba80)54tbsx@ghi%03b4fyq9'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    'localhost',
+    '127.0.0.1',
+    '[::1]',
+    'testserver',
+]
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'posts.apps.PostsConfig',
+    'core.apps.CoreConfig',
+    'about.apps.AboutConfig',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'users.apps.UsersConfig',
+    'sorl.thumbnail',
+]
+
+MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # После AuthenticationMiddleware: анонимность проверяется по user
+    'posts.middleware.AnonymousPageCacheMiddleware',
+    'core.replicas.ReplicaMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Добавлено: Искать шаблоны на уровне проекта
+        'DIRS': [TEMPLATES_DIR],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'core.context_processors.year.year',
+            ]
+        },
+    }
+]
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+# ASGI-сервер запускает то же приложение через мост core.asgi: запросы
+# выполняются в пуле из ASGI_THREADS потоков, а медленные клиенты
+# обслуживает цикл событий. Сравнение путей: manage.py loadtest
+ASGI_APPLICATION = 'yatube.asgi.application'
+ASGI_THREADS = 8
+
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    }
+}
+
+# Реплики для чтения лент: YATUBE_DB_REPLICAS=N добавляет N баз
+# replicaK - копий db.sqlite3, которые обновляет manage.py replicate.
+# В тестах реплики - зеркала основной БД.
+DATABASE_REPLICAS = [
+    f'replica{number}'
+    for number in range(1, int(os.environ.get('YATUBE_DB_REPLICAS', 0)) + 1)
+]
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    for alias in DATABASE_REPLICAS
+})
+
+# Шарды постов и комментариев (см. posts.sharding): основная БД и ещё
+# YATUBE_POSTS_SHARDS=N баз shardK. После изменения их числа нужен
+# manage.py rebalance_shards.
+POSTS_SHARDS = ['default'] + [
+    f'shard{number}'
+    for number in range(1, int(os.environ.get('YATUBE_POSTS_SHARDS', 0)) + 1)
+]
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+    }
+    for alias in POSTS_SHARDS[1:]
+})
+# Шарды решают первыми: посты и комментарии пишутся на шард автора
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter', 'core.replicas.ReplicaRouter',
+]
+# View, которые читают с реплик, и сколько секунд клиент после своей
+# записи читает только с основной БД
+REPLICA_VIEWS = (
+    'posts:posts_index', 'posts:group_list', 'posts:profile',
+    'posts:post_detail', 'posts:follow',
+)
+REPLICA_STICKY_SECONDS = 10
+
+# PRAGMA, которые core.db выполняет на каждом новом соединении SQLite.
+# WAL: чтение не ждёт записи, а запись - чтения; synchronous=NORMAL в
+# WAL сохраняет целостность, при сбое питания теряются лишь последние
+# транзакции. mmap_size и cache_size (в КиБ, если отрицательный) держат
+# горячие страницы в памяти, busy_timeout - сколько мс ждать блокировку
+# записи, прежде чем ответить "database is locked".
+# Сравнение с журналом отката: manage.py bench_sqlite
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/2.2/howto/static-files/
+
+STATIC_URL = '/static/'
+
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# yatube/settings.py
+
+LOGIN_URL = 'users:login'
+LOGIN_REDIRECT_URL = 'posts:posts_index'
+# LOGOUT_REDIRECT_URL = 'posts:index'
+
+#  подключаем движок filebased.EmailBackend
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# указываем директорию, в которую будут складываться файлы писем
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Кэш выбирается переменной YATUBE_CACHE_BACKEND: 'locmem' - свой у
+# каждого процесса (разработка, тесты), 'sqlite' - один файл на узел,
+# общий для всех воркеров gunicorn. Оба бэкенда считают попадания.
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'core.cache.InstrumentedLocMemCache',
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'KEY_PREFIX': 'yatube',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            # Фрагменты HTML крупнее этого размера сжимаются zlib
+            'COMPRESS_MIN_LENGTH': 1024,
+        },
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('YATUBE_CACHE_BACKEND', 'locmem')],
+}
+
+# Защита от лавины пересчётов (core.stampede, тег {% load stampede %}):
+# истёкшая запись отдаётся ещё CACHE_STALE_TIMEOUT секунд, пока её
+# пересчитывает один процесс; остальные ждут новую запись не дольше
+# CACHE_LOCK_WAIT. Чем больше BETA, тем раньше начинается обновление.
+CACHE_STALE_TIMEOUT = 60
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 2
+CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Keyset-пагинация лент по (pub_date, id): без COUNT(*) и OFFSET,
+# в шаблоне остаются только ссылки "Предыдущая"/"Следующая".
+POSTS_CURSOR_PAGINATION = False
+
+# Лента "Избранные авторы": посты раскладываются по лентам подписчиков
+# при публикации (fan-out on write). Авторы, у которых подписчиков больше
+# лимита, читаются напрямую при открытии ленты (fan-out on read).
+POSTS_TIMELINE_FANOUT_LIMIT = 10000
+# Сколько последних постов автора попадает в ленту сразу после подписки
+POSTS_TIMELINE_BACKFILL = 500
+POSTS_TIMELINE_BATCH_SIZE = 1000
+
+# Фрагмент главной ленты хранится долго: его ключ содержит поколение
+# данных, которое сигналы Post/Comment увеличивают при каждой записи.
+POSTS_FEED_CACHE_TIMEOUT = 60 * 60
+
+# Блок комментариев кэшируется на пост; версия меняется с каждым новым
+# или удалённым комментарием этого поста.
+POSTS_COMMENTS_CACHE_TIMEOUT = 60 * 60
+
+# Страницы для анонимов кэшируются целиком и сбрасываются сигналами по
+# суррогатным ключам (пост, автор, группа), поэтому срок хранения большой.
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Готовый HTML карточек постов: ключ меняется вместе с содержимым
+# карточки, так что старые записи только дожидаются вытеснения.
+POSTS_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Выборочное профилирование (core.profiling): доля замеряемых запросов,
+# как часто процесс сбрасывает гистограммы в общий кэш и сколько они там
+# хранятся. Отчёт: manage.py profiling_report или /admin/profiling/;
+# команде нужен общий для процессов кэш (YATUBE_CACHE_BACKEND=sqlite).
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_FLUSH_INTERVAL = 10
+PROFILING_TIMEOUT = 24 * 60 * 60
+
+# Миниатюры для лент строятся после сохранения поста в пуле процессов;
+# 0 - строить синхронно в том же запросе.
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Ширины и форматы вариантов картинки для srcset; недоступные в текущей
+# сборке Pillow форматы (AVIF, WebP) пропускаются, JPEG есть всегда.
+POSTS_IMAGE_WIDTHS = (480, 960, 1440)
+POSTS_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+
+# Загрузки сразу пишутся во временный файл на диске; сверх лимита байты
+# отбрасываются, а форма отклоняет файл, не декодируя его целиком.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedTemporaryFileUploadHandler']
+POSTS_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40_000_000
+
+# Поиск по постам: FTS5-индекс SQLite с ранжированием bm25. Для баз без
+# FTS5 - 'posts.search.SimpleBackend' (LIKE без индекса и ранжирования).
+POSTS_SEARCH_BACKEND = 'posts.search.FTS5Backend'
+# Ранжируются и листаются только столько самых новых совпадений
+POSTS_SEARCH_MAX_RESULTS = 1000
+
+# Импорт и экспорт данных (import_data/export_data): строк в одной
+# транзакции bulk_create и между сообщениями о прогрессе.
+POSTS_TRANSFER_BATCH_SIZE = 5000
+
+# Кэш объектов групп, авторов и постов: LRU на столько записей в каждом
+# процессе перед общим кэшем; актуальность проверяется по версиям.
+POSTS_OBJECT_CACHE_SIZE = 1000
+POSTS_OBJECT_CACHE_TIMEOUT = 60 * 60
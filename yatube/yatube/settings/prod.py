@@ -0,0 +1,51 @@
+"""Рабочее окружение: без отладки, с постоянными соединениями к БД
+и кэшем скомпилированных шаблонов.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import ALLOWED_HOSTS, CACHE_BACKENDS, DATABASES, TEMPLATES
+
+DEBUG = False
+
+# Ключ из репозитория известен всем: без своего ключа не запускаемся
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured(
+        'Для рабочего профиля задайте переменную YATUBE_SECRET_KEY'
+    )
+
+ALLOWED_HOSTS = ALLOWED_HOSTS + [
+    host for host in os.environ.get('YATUBE_ALLOWED_HOSTS', '').split(',')
+    if host
+]
+
+# Соединение живёт между запросами потока: не открывать файл и не
+# выполнять PRAGMA на каждый запрос
+DATABASES = {
+    alias: {**config, 'CONN_MAX_AGE': 600}
+    for alias, config in DATABASES.items()
+}
+
+# Шаблоны компилируются один раз на процесс, а не на каждый рендер.
+# С явными loaders APP_DIRS должен быть выключен.
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [(
+            'django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
+        )],
+    },
+}]
+
+# Общий для воркеров узла кэш вместо своего у каждого процесса
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('YATUBE_CACHE_BACKEND', 'sqlite')],
+}
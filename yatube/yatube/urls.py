@@ -3,12 +3,16 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core import views as core_views
+
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.internal_server_error'
 handler403 = 'core.views.permission_denied'
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    # Раньше admin/: иначе адрес перехватит админка
+    path('admin/profiling/', core_views.profiling_report, name='profiling'),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('users.urls', namespace='auth')),